@@ -14,6 +14,9 @@ class Settings(BaseSettings):
     QDRANT_HOST: str | None = None
     QDRANT_PORT: int | None = None
 
+    # Redis (cache, Celery broker, embedding shard row counter)
+    REDIS_URL: str = "redis://redis:6379/0"
+
     # AWS S3
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
@@ -24,6 +27,8 @@ class Settings(BaseSettings):
     # Model
     MODEL_DEVICE: str = "cpu"
     BATCH_SIZE: int = 32
+    # Exported (on first use) ImageBind vision tower for ONNX Runtime; empty disables
+    ONNX_VISION_MODEL: str = ""
 
     class Config:
         env_file = ".env"
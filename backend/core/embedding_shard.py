@@ -0,0 +1,152 @@
+# backend/core/embedding_shard.py
+"""
+Shared int8 embedding shards written by all embedding workers.
+Each shard is one preallocated .npy file indexed by row (embeddings-{n}.i8.npy),
+plus an append-only CSV sidecar (embeddings-{n}.index.csv, header
+media_id,row,scale) that says which rows are filled. When a shard is full,
+workers roll over to shard n+1. Rows are handed
+out by a Redis counter keyed to the shard file (reseeded from the sidecar if
+Redis loses it), so concurrent workers never overlap and ingestion can mmap
+the shard and gather the rows listed in the sidecar.
+"""
+import fcntl
+import logging
+import os
+import re
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import redis
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+INDEX_HEADER = "media_id,row,scale\n"
+_SHARD_NAME = re.compile(r"embeddings-(\d+)\.i8\.npy")
+
+# Reserves `n` rows only if they fit: returns the new end row, -1 if the
+# counter is missing (needs seeding), -2 if the shard is full
+_RESERVE_ROWS = """
+local cur = redis.call('GET', KEYS[1])
+if not cur then return -1 end
+if tonumber(cur) + tonumber(ARGV[1]) > tonumber(ARGV[2]) then return -2 end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+
+
+class EmbeddingShardWriter:
+    def __init__(self, emb_dir: str, dim: int = 1024, max_rows: int = 1_000_000, redis_url: str = None):
+        self.emb_dir = Path(emb_dir)
+        self.emb_dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.max_rows = max_rows
+        self.redis = redis.from_url(redis_url or settings.REDIS_URL)
+        self._reserve_rows = self.redis.register_script(_RESERVE_ROWS)
+
+        # Pick up at the newest shard; earlier ones are full
+        shard_nos = [int(m.group(1)) for m in map(_SHARD_NAME.fullmatch, os.listdir(self.emb_dir)) if m]
+        self._open_shard(max(shard_nos, default=0))
+
+    def _open_shard(self, shard_no: int):
+        self.shard_no = shard_no
+        self.shard_path = self.emb_dir / f"embeddings-{shard_no}.i8.npy"
+        self.index_path = self.emb_dir / f"embeddings-{shard_no}.index.csv"
+        self._create_shard(self.dim, self.max_rows)
+        self.shard = np.load(self.shard_path, mmap_mode="r+")
+        if self.shard.shape[1] != self.dim:
+            raise ValueError(f"Shard {self.shard_path} has dim {self.shard.shape[1]}, expected {self.dim}")
+        self.counter_key = self._counter_key(self.shard_path)
+        self._seed_counter()
+
+    def _counter_key(self, path: Path) -> str:
+        """Counter belongs to this shard file (by inode); a recreated shard gets a fresh counter"""
+        return f"embeddings:shard:{self.shard_path.name}:{os.stat(path).st_ino}:next_row"
+
+    def _create_shard(self, dim: int, max_rows: int):
+        """Create the sparse shard and a header-only sidecar once, under a lock shared by all workers"""
+        if self.shard_path.exists():
+            return
+        with open(self.emb_dir / ".embeddings.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.shard_path.exists():
+                return
+            tmp = self.shard_path.with_name(f".{self.shard_path.name}.{os.getpid()}")
+            arr = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.int8, shape=(max_rows, dim))
+            del arr
+            try:
+                # Nothing can write to the new shard before it is in place, so reset
+                # its counter (the inode may be reused) and start its sidecar now
+                self.redis.set(self._counter_key(tmp), 0)
+                if self.index_path.exists():
+                    self.index_path.rename(self.index_path.with_name(f"{self.index_path.name}.{os.stat(tmp).st_ino}.stale"))
+                with open(self.index_path, "w") as f:
+                    f.write(INDEX_HEADER)
+                os.replace(tmp, self.shard_path)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+        logger.info(f"Created embedding shard {self.shard_path} ({max_rows:,} x {dim})")
+
+    def _seed_counter(self):
+        """
+        If Redis lost the counter (restart without persistence, flush), restart it
+        after the highest row recorded in the sidecar rather than at 0
+        """
+        if self.redis.exists(self.counter_key):
+            return
+        next_row = 0
+        if self.index_path.exists():
+            with open(self.index_path) as f:
+                next(f, None)  # header
+                for line in f:
+                    next_row = max(next_row, int(line.rsplit(",", 2)[1]) + 1)
+        if self.redis.set(self.counter_key, next_row, nx=True):
+            logger.warning(f"Seeded embedding shard row counter at {next_row:,} from {self.index_path}")
+
+    def write(self, media_ids: List[str], q: np.ndarray, scales: np.ndarray) -> int:
+        """
+        Write int8 vectors (N, D) with their scales (N,) to the next free rows,
+        rolling over to a new shard when the current one is full.
+        Returns the first row index within self.shard_path.
+        """
+        n = len(media_ids)
+        if n > self.max_rows:
+            raise ValueError(f"Batch of {n:,} vectors is larger than a shard ({self.max_rows:,} rows)")
+        while True:
+            stop = self._reserve_rows(keys=[self.counter_key], args=[n, self.shard.shape[0]])
+            if stop == -1:
+                self._seed_counter()
+                stop = self._reserve_rows(keys=[self.counter_key], args=[n, self.shard.shape[0]])
+            if stop != -2:
+                break
+            # Full: whichever worker gets there first creates the next shard
+            logger.info(f"Embedding shard {self.shard_path} full ({self.shard.shape[0]:,} rows), rolling over")
+            self._open_shard(self.shard_no + 1)
+        start = stop - n
+
+        self.shard[start:stop] = q.reshape(n, -1)
+        self.shard.flush()
+
+        lines = "".join(
+            f"{media_id},{start + i},{scale!r}\n"
+            for i, (media_id, scale) in enumerate(zip(media_ids, np.atleast_1d(scales).tolist()))
+        )
+        # Single O_APPEND write, so lines from concurrent workers don't interleave
+        with open(self.index_path, "a") as f:
+            f.write(lines)
+        return start
+
+
+# singleton accessor
+_writer = None
+def get_shard_writer(emb_dir: str = None):
+    global _writer
+    if _writer is None:
+        _writer = EmbeddingShardWriter(
+            emb_dir or os.getenv("EMBEDDINGS_DIR", "/app/data/embeddings"),
+            max_rows=int(os.getenv("EMBEDDINGS_SHARD_ROWS", "1000000")),
+        )
+    return _writer
@@ -3,11 +3,18 @@
 ImageBind embedder (GPU-enabled).
 Falls back to CPU if GPU unavailable.
 """
+import contextlib
+import fcntl
 import logging
+import os
+import threading
+from pathlib import Path
 from typing import List
 import numpy as np
 import torch
 
+from .config import get_settings
+
 logger = logging.getLogger(__name__)
 
 # Try to import ImageBind
@@ -21,11 +28,104 @@ except Exception as e:
     _IMAGEBIND_AVAILABLE = False
     ModalityType = None
 
+# Optional ONNX Runtime path for the vision tower
+try:
+    import onnxruntime as ort
+    _ORT_AVAILABLE = True
+except Exception as e:
+    logger.debug(f"onnxruntime not available: {e}")
+    _ORT_AVAILABLE = False
+
+
+def _l2_normalize_inplace(x: np.ndarray) -> None:
+    """Row-wise L2 normalize a float32 (N, D) array without temporaries the size of x"""
+    norms = np.einsum("ij,ij->i", x, x)
+    np.sqrt(norms, out=norms)
+    norms += np.float32(1e-8)
+    x /= norms[:, None]
+
+class _VisionTower(torch.nn.Module):
+    """Tensor-in/tensor-out view of the vision modality, for ONNX export"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model({ModalityType.VISION: x})[ModalityType.VISION]
+
+
+class OnnxVisionRunner:
+    """
+    ONNX Runtime session for the vision tower with IO binding.
+    Input and output live in preallocated CUDA buffers that are bound by
+    pointer, so batches never round-trip through numpy between calls.
+    """
+    def __init__(self, onnx_path: str, device: str, max_batch: int, embedding_dim: int = 1024):
+        device_id = torch.device(device).index or 0
+        self.session = ort.InferenceSession(
+            onnx_path,
+            providers=[("CUDAExecutionProvider", {"device_id": device_id}), "CPUExecutionProvider"],
+        )
+        self.binding = self.session.io_binding()
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+        self.device_id = device_id
+        self.max_batch = max_batch
+        self.input_buf = torch.empty((max_batch, 3, 224, 224), dtype=torch.float32, device=device)
+        self.output_buf = torch.empty((max_batch, embedding_dim), dtype=torch.float32, device=device)
+
+    @staticmethod
+    def export(model, onnx_path: str, device: str):
+        """
+        Export the vision tower once, with a dynamic batch axis.
+        Every prefork child can get here on first load, so the export runs under
+        a file lock and lands via os.replace; nobody loads a half-written file
+        """
+        path = Path(onnx_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_name(f"{path.name}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if path.exists():
+                return
+            tmp = path.with_name(f".{path.name}.{os.getpid()}")
+            dummy = torch.randn(1, 3, 224, 224, device=device)
+            try:
+                torch.onnx.export(
+                    _VisionTower(model).eval(), (dummy,), str(tmp),
+                    input_names=["vision"], output_names=["embedding"],
+                    dynamic_axes={"vision": {0: "batch"}, "embedding": {0: "batch"}},
+                    opset_version=17,
+                )
+                os.replace(tmp, path)
+            finally:
+                tmp.unlink(missing_ok=True)
+        logger.info(f"Exported ImageBind vision tower to {onnx_path}")
+
+    def run(self, x: torch.Tensor) -> torch.Tensor:
+        """x: (n, 3, 224, 224) with n <= max_batch; returns a view of the output buffer"""
+        n = x.shape[0]
+        self.input_buf[:n].copy_(x, non_blocking=True)
+        self.binding.bind_input(
+            self.input_name, "cuda", self.device_id, np.float32,
+            (n, 3, 224, 224), self.input_buf.data_ptr(),
+        )
+        self.binding.bind_output(
+            self.output_name, "cuda", self.device_id, np.float32,
+            (n, self.output_buf.shape[1]), self.output_buf.data_ptr(),
+        )
+        # ORT runs on its own stream; make sure the input copy has landed
+        torch.cuda.current_stream().synchronize()
+        self.session.run_with_iobinding(self.binding)
+        return self.output_buf[:n]
+
+
 class ImageBindEmbedder:
-    def __init__(self, device: str = "cuda:0", batch_size: int = 32):
+    def __init__(self, device: str = "cuda:0", batch_size: int = 32, onnx_vision_path: str = None):
         self.device = device if torch.cuda.is_available() and device.startswith("cuda") else "cpu"
         self.batch_size = batch_size
+        self.onnx_vision_path = onnx_vision_path
         self.model = None
+        self._onnx_vision = None
         logger.info(f"Initializing ImageBindEmbedder on {self.device}")
         if _IMAGEBIND_AVAILABLE:
             self._load_model()
@@ -38,6 +138,16 @@ class ImageBindEmbedder:
         model = imagebind_model.imagebind_huge(pretrained=True)
         model.eval()
         model.to(self.device)
+        if self.device != "cpu":
+            # TF32 matmuls on Ampere+, NHWC layout for the cuDNN 2D conv stems
+            # (the vision stem is a Conv3d, which channels_last doesn't apply to)
+            torch.set_float32_matmul_precision("high")
+            for module in model.modules():
+                if isinstance(module, torch.nn.Conv2d):
+                    module.to(memory_format=torch.channels_last)
+        # ONNX Runtime + IO binding for the vision tower (GPU only)
+        if self.onnx_vision_path and self.device != "cpu":
+            self._load_onnx_vision(model)
         # optional compile
         if self.device != "cpu" and hasattr(torch, "compile"):
             try:
@@ -47,6 +157,32 @@ class ImageBindEmbedder:
         self.model = model
         logger.info("ImageBind model loaded")
 
+    def _load_onnx_vision(self, model):
+        if not _ORT_AVAILABLE:
+            logger.warning("onnxruntime not installed, using torch for vision")
+            return
+        try:
+            if not Path(self.onnx_vision_path).exists():
+                OnnxVisionRunner.export(model, self.onnx_vision_path, self.device)
+            self._onnx_vision = OnnxVisionRunner(self.onnx_vision_path, self.device, self.batch_size)
+            logger.info("ONNX Runtime vision runner ready")
+        except Exception as e:
+            logger.warning(f"ONNX vision runner disabled: {e}")
+
+    def _embed_vision(self, batch: List[str]) -> np.ndarray:
+        x = data.load_and_transform_vision_data(batch, device=self.device)
+        if self._onnx_vision is not None:
+            return self._onnx_vision.run(x).cpu().numpy()
+        with self._autocast():
+            out = self.model({ModalityType.VISION: x})
+        return out[ModalityType.VISION].float().cpu().numpy()
+
+    def _autocast(self):
+        """bf16 autocast on GPUs that support it; full precision on CPU"""
+        if self.device != "cpu" and torch.cuda.is_bf16_supported():
+            return torch.autocast(device_type="cuda", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
     @torch.inference_mode()
     def embed_text(self, texts: List[str]) -> np.ndarray:
         if self.model is None:
@@ -55,12 +191,13 @@ class ImageBindEmbedder:
         for i in range(0, len(texts), self.batch_size):
             batch = texts[i:i+self.batch_size]
             inputs = {ModalityType.TEXT: data.load_and_transform_text(batch, device=self.device)}
-            out = self.model(inputs)
-            emb = out[ModalityType.TEXT].cpu().numpy()
+            with self._autocast():
+                out = self.model(inputs)
+            emb = out[ModalityType.TEXT].float().cpu().numpy()
             all_emb.append(emb)
-        result = np.vstack(all_emb).astype(np.float32)
-        norms = np.linalg.norm(result, axis=1, keepdims=True)
-        return (result / (norms + 1e-8)).astype(np.float32)
+        result = np.vstack(all_emb).astype(np.float32, copy=False)
+        _l2_normalize_inplace(result)
+        return result
 
     @torch.inference_mode()
     def embed_images(self, image_paths: List[str]) -> np.ndarray:
@@ -69,13 +206,11 @@ class ImageBindEmbedder:
         all_emb = []
         for i in range(0, len(image_paths), self.batch_size):
             batch = image_paths[i:i+self.batch_size]
-            inputs = {ModalityType.VISION: data.load_and_transform_vision_data(batch, device=self.device)}
-            out = self.model(inputs)
-            emb = out[ModalityType.VISION].cpu().numpy()
+            emb = self._embed_vision(batch)
             all_emb.append(emb)
-        result = np.vstack(all_emb).astype(np.float32)
-        norms = np.linalg.norm(result, axis=1, keepdims=True)
-        return (result / (norms + 1e-8)).astype(np.float32)
+        result = np.vstack(all_emb).astype(np.float32, copy=False)
+        _l2_normalize_inplace(result)
+        return result
 
     @torch.inference_mode()
     def embed_audio(self, audio_paths: List[str]) -> np.ndarray:
@@ -85,12 +220,13 @@ class ImageBindEmbedder:
         for i in range(0, len(audio_paths), self.batch_size):
             batch = audio_paths[i:i+self.batch_size]
             inputs = {ModalityType.AUDIO: data.load_and_transform_audio_data(batch, device=self.device)}
-            out = self.model(inputs)
-            emb = out[ModalityType.AUDIO].cpu().numpy()
+            with self._autocast():
+                out = self.model(inputs)
+            emb = out[ModalityType.AUDIO].float().cpu().numpy()
             all_emb.append(emb)
-        result = np.vstack(all_emb).astype(np.float32)
-        norms = np.linalg.norm(result, axis=1, keepdims=True)
-        return (result / (norms + 1e-8)).astype(np.float32)
+        result = np.vstack(all_emb).astype(np.float32, copy=False)
+        _l2_normalize_inplace(result)
+        return result
 
     @torch.inference_mode()
     def embed_videos(self, video_paths: List[str]) -> np.ndarray:
@@ -101,33 +237,44 @@ class ImageBindEmbedder:
         all_emb = []
         for i in range(0, len(video_paths), self.batch_size):
             batch = video_paths[i:i+self.batch_size]
-            inputs = {ModalityType.VISION: data.load_and_transform_vision_data(batch, device=self.device)}
-            out = self.model(inputs)
-            emb = out[ModalityType.VISION].cpu().numpy()
+            emb = self._embed_vision(batch)
             all_emb.append(emb)
-        result = np.vstack(all_emb).astype(np.float32)
-        norms = np.linalg.norm(result, axis=1, keepdims=True)
-        return (result / (norms + 1e-8)).astype(np.float32)
+        result = np.vstack(all_emb).astype(np.float32, copy=False)
+        _l2_normalize_inplace(result)
+        return result
 
-    def embed_single(self, path: str, modality: str):
+    def embed_batch(self, paths: List[str], modality: str) -> np.ndarray:
+        """Embed many inputs of one modality into a single (N, D) float32 array"""
         modality = modality.lower()
         if modality == "image":
-            return self.embed_images([path])[0]
+            return self.embed_images(paths)
         elif modality == "audio":
-            return self.embed_audio([path])[0]
+            return self.embed_audio(paths)
         elif modality == "video":
-            return self.embed_videos([path])[0]
+            return self.embed_videos(paths)
         elif modality == "text":
-            return self.embed_text([path])[0]
+            return self.embed_text(paths)
         else:
             raise ValueError(f"Unknown modality {modality}")
 
+    def embed_single(self, path: str, modality: str):
+        return self.embed_batch([path], modality)[0]
+
 
 # singleton accessor
 _embedder = None
+# Warm-up thread and the first task may race to build the model; load it once
+_embedder_lock = threading.Lock()
 def get_embedder(device: str = None, batch_size: int = None):
     global _embedder
     settings_device = device
-    if _embedder is None:
-        _embedder = ImageBindEmbedder(device=(device or "cuda:0"), batch_size=(batch_size or 32))
+    if _embedder is not None:
+        return _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = ImageBindEmbedder(
+                device=(device or "cuda:0"),
+                batch_size=(batch_size or 32),
+                onnx_vision_path=(get_settings().ONNX_VISION_MODEL or None),
+            )
     return _embedder
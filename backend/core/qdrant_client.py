@@ -1,13 +1,16 @@
 from qdrant_client import QdrantClient
 
 
-def get_qdrant_client(url: str, api_key: str) -> QdrantClient:
+def get_qdrant_client(url: str, api_key: str, prefer_grpc: bool = False) -> QdrantClient:
     """
     Always use Qdrant Cloud over HTTPS.
     No host/port. No timeout. No wrappers.
+    prefer_grpc sends points as binary protobuf instead of JSON (bulk writers).
     """
     return QdrantClient(
         url=url,
         api_key=api_key,
         timeout=30,           # Safe default built-in
+        grpc_port=6334,
+        prefer_grpc=prefer_grpc,
     )
@@ -4,6 +4,7 @@ S3 upload helpers and presigned URL generation.
 All objects uploaded are private. We return presigned URLs to clients.
 """
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from pathlib import Path
 from typing import Tuple
@@ -16,13 +17,28 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+# Parallel 8 MiB parts for large objects; small files still go in one PUT
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+_client = None
+
+
 def _s3_client():
-    return boto3.client(
-        "s3",
-        region_name=settings.AWS_REGION,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
+    """Process-wide client, so connections (and TLS sessions) are pooled across uploads"""
+    global _client
+    if _client is None:
+        _client = boto3.session.Session().client(
+            "s3",
+            region_name=settings.AWS_REGION,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        )
+    return _client
 
 
 def upload_file_to_s3(local_path: Path, key: str) -> str:
@@ -33,7 +49,7 @@ def upload_file_to_s3(local_path: Path, key: str) -> str:
     client = _s3_client()
     bucket = settings.AWS_S3_BUCKET
     try:
-        client.upload_file(str(local_path), bucket, key, ExtraArgs={"ACL": "private", "ContentType": _guess_content_type(local_path)})
+        client.upload_file(str(local_path), bucket, key, ExtraArgs={"ACL": "private", "ContentType": _guess_content_type(local_path)}, Config=_TRANSFER_CONFIG)
         logger.info(f"Uploaded {local_path} -> s3://{bucket}/{key}")
         return key
     except ClientError as e:
@@ -50,10 +50,13 @@ def run():
     out = wait_for_task(task_id, timeout=180)
     print("Task result:", out)
 
-    emb_path = f"/app/data/embeddings/{media_id}.npy"
-    print("Check embedding file exists at:", emb_path)
+    emb_dir = Path("/app/data/embeddings")
+    print("Check embedding row recorded in:", emb_dir)
     # When running on host, path may be under ./data/embeddings
-    if os.path.exists(emb_path) or os.path.exists(f"data/embeddings/{media_id}.npy"):
+    if not emb_dir.exists():
+        emb_dir = Path("data/embeddings")
+    index_paths = sorted(emb_dir.glob("embeddings-*.index.csv"))
+    if any(line.startswith(f"{media_id},") for index_path in index_paths for line in open(index_path)):
         print("Embedding exists ✅")
     else:
         print("Embedding missing ❌")
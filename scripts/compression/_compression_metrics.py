@@ -0,0 +1,45 @@
+"""
+Numba kernel for compression quality metrics
+Used by evaluate_compression
+CPU ONLY
+"""
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def compression_sums(original, reconstructed):
+    """
+    One streaming pass over both matrices, no N x D temporaries
+
+    Returns (sum of squared error, sum of absolute error, sum of per-row cosine)
+    """
+    n_vectors, dim = original.shape
+
+    se_total = 0.0
+    ae_total = 0.0
+    cos_total = 0.0
+
+    for i in prange(n_vectors):
+        se = 0.0
+        ae = 0.0
+        dot = 0.0
+        norm_o = 0.0
+        norm_r = 0.0
+
+        for j in range(dim):
+            o = np.float64(original[i, j])
+            r = np.float64(reconstructed[i, j])
+            diff = o - r
+            se += diff * diff
+            ae += abs(diff)
+            dot += o * r
+            norm_o += o * o
+            norm_r += r * r
+
+        se_total += se
+        ae_total += ae
+        cos_total += dot / ((np.sqrt(norm_o) + 1e-8) * (np.sqrt(norm_r) + 1e-8))
+
+    return se_total, ae_total, cos_total
@@ -0,0 +1,45 @@
+"""
+Numba PQ assignment kernel
+Used by ProductQuantizer.encode when faiss is not installed
+CPU ONLY
+"""
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def pq_assign(X, codebooks_soa, cb_sq, codes):
+    """
+    Write the nearest centroid of every subvector into `codes`
+
+    X:              (N, M * d) float32
+    codebooks_soa:  (M, d, K) float32, centroids laid out so the inner K loop
+                    reads contiguous memory and auto-vectorizes
+    cb_sq:          (M, K) float32, squared centroid norms
+    codes:          (N, M) uint8 output
+    """
+    n_vectors = X.shape[0]
+    n_subspaces, subvector_dim, n_centroids = codebooks_soa.shape
+
+    for i in prange(n_vectors):
+        dist = np.empty(n_centroids, dtype=np.float32)
+
+        for m in range(n_subspaces):
+            offset = m * subvector_dim
+
+            # ||c||^2 - 2 x.c  (||x||^2 is constant over centroids)
+            for k in range(n_centroids):
+                dist[k] = cb_sq[m, k]
+            for j in range(subvector_dim):
+                xv = -2.0 * X[i, offset + j]
+                for k in range(n_centroids):
+                    dist[k] += xv * codebooks_soa[m, j, k]
+
+            best = 0
+            best_dist = dist[0]
+            for k in range(1, n_centroids):
+                if dist[k] < best_dist:
+                    best_dist = dist[k]
+                    best = k
+            codes[i, m] = best
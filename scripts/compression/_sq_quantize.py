@@ -0,0 +1,30 @@
+"""
+Numba scalar quantization kernel
+Used by ScalarQuantizer.quantize
+CPU ONLY
+"""
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def sq_quantize(X, inv_scale, bias, out):
+    """
+    out = clip(X * inv_scale + bias, 0, 255) as uint8, in a single pass
+
+    X:          (N, D) float32
+    inv_scale:  (D,) float32, 255 / (max - min)
+    bias:       (D,) float32, -min * inv_scale
+    out:        (N, D) uint8 output
+    """
+    n_vectors, dim = X.shape
+
+    for i in prange(n_vectors):
+        for j in range(dim):
+            q = X[i, j] * inv_scale[j] + bias[j]
+            if q < 0.0:
+                q = 0.0
+            elif q > 255.0:
+                q = 255.0
+            out[i, j] = np.uint8(q)
@@ -5,12 +5,63 @@ CPU ONLY
 
 import numpy as np
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from tqdm import tqdm
 from compression_utils import ProductQuantizer, ScalarQuantizer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Thread pools capped in workers so processes don't oversubscribe the cores
+_SINGLE_THREAD_ENV = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMBA_NUM_THREADS",
+)
+
+# Per-process state, populated by _init_worker
+_worker = {}
+
+
+def _init_worker(emb_file: Path, model_dir: Path, output_dir: Path):
+    try:
+        import faiss
+        faiss.omp_set_num_threads(1)
+    except ImportError:
+        pass
+
+    pq = ProductQuantizer()
+    pq.load(model_dir / "pq_codebook.pkl")
+
+    sq = ScalarQuantizer()
+    sq.load(model_dir / "scalar_quantizer.pkl")
+
+    _worker["pq"] = pq
+    _worker["sq"] = sq
+    _worker["vectors"] = np.load(emb_file, mmap_mode="r")
+    _worker["pq_codes"] = np.load(output_dir / "pq_codes.npy", mmap_mode="r+")
+    _worker["quantized"] = np.load(output_dir / "int8_vectors.npy", mmap_mode="r+")
+
+
+def _compress_chunk(start: int, stop: int) -> int:
+    """Encode rows [start, stop) into this worker's slice of the outputs"""
+    chunk = _worker["vectors"][start:stop]
+
+    # PQ encode
+    _worker["pq"].encode(chunk, out=_worker["pq_codes"][start:stop])
+
+    # INT8 quantization
+    _worker["sq"].quantize(chunk, out=_worker["quantized"][start:stop])
+
+    _worker["pq_codes"].flush()
+    _worker["quantized"].flush()
+    return stop - start
+
+
 def main():
     import argparse
 
@@ -18,6 +69,8 @@ def main():
     parser.add_argument("--embeddings", required=True)
     parser.add_argument("--model-dir", default="data/models")
     parser.add_argument("--output-dir", default="data/compressed")
+    parser.add_argument("--chunk-size", type=int, default=262144)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
     args = parser.parse_args()
 
     emb_file = Path(args.embeddings)
@@ -26,27 +79,46 @@ def main():
     output_dir.mkdir(parents=True, exist_ok=True)
 
     logger.info(f"Loading embeddings from {emb_file}")
-    vectors = np.load(emb_file)
+    # Memory-map so only the chunk being encoded is paged in
+    vectors = np.load(emb_file, mmap_mode="r")
+    n_vectors = vectors.shape[0]
 
-    # Load PQ model
     pq = ProductQuantizer()
     pq.load(model_dir / "pq_codebook.pkl")
 
-    # Load scalar quantizer
-    sq = ScalarQuantizer()
-    sq.load(model_dir / "scalar_quantizer.pkl")
-
-    logger.info(f"Encoding {vectors.shape[0]:,} vectors...")
+    # Outputs are written straight to disk, sized ahead of time;
+    # workers reopen them and fill disjoint row ranges
+    pq_codes = np.lib.format.open_memmap(
+        output_dir / "pq_codes.npy", mode="w+",
+        dtype=np.uint8, shape=(n_vectors, pq.n_subspaces)
+    )
+    quantized = np.lib.format.open_memmap(
+        output_dir / "int8_vectors.npy", mode="w+",
+        dtype=np.uint8, shape=vectors.shape
+    )
+    pq_codes.flush()
+    quantized.flush()
+    del pq_codes, quantized
 
-    # PQ encode
-    pq_codes = pq.encode(vectors)
+    logger.info(f"Encoding {n_vectors:,} vectors with {args.workers} workers...")
 
-    # INT8 quantization
-    quantized = sq.quantize(vectors)
+    # Spawned workers pick these up before numpy initializes its BLAS
+    for var in _SINGLE_THREAD_ENV:
+        os.environ[var] = "1"
 
-    # Save
-    np.save(output_dir / "pq_codes.npy", pq_codes)
-    np.save(output_dir / "int8_vectors.npy", quantized)
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(emb_file, model_dir, output_dir)
+    ) as executor:
+        futures = [
+            executor.submit(_compress_chunk, i, min(i + args.chunk_size, n_vectors))
+            for i in range(0, n_vectors, args.chunk_size)
+        ]
+        with tqdm(total=n_vectors, desc="Compressing") as pbar:
+            for future in as_completed(futures):
+                pbar.update(future.result())
 
     logger.info("✓ Compression complete")
     logger.info(f"PQ codes saved to: {output_dir/'pq_codes.npy'}")
@@ -8,13 +8,30 @@ import numpy as np
 import pickle
 from pathlib import Path
 import logging
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 from sklearn.cluster import MiniBatchKMeans
 from tqdm import tqdm
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# faiss trains k-means in multi-threaded SIMD C++; fall back to sklearn without it
+try:
+    import faiss
+    _FAISS_AVAILABLE = True
+except ImportError:
+    logger.warning("faiss not available, falling back to sklearn MiniBatchKMeans")
+    _FAISS_AVAILABLE = False
+
+# Numba-JIT'd assignment kernel for CPUs without a strong BLAS
+try:
+    from _pq_assign import pq_assign
+    from _sq_quantize import sq_quantize
+    from _compression_metrics import compression_sums
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
 
 # ---------------------------------------------------------
 # PRODUCT QUANTIZER
@@ -36,57 +53,137 @@ class ProductQuantizer:
         self.codebooks = []
         self.is_trained = False
 
+        # Derived from codebooks by _prepare_codebooks()
+        self._cb_stack = None
+        self._cb_sq = None
+        self._cb_soa = None
+        self._cb_soa_neg2 = None
+        self._faiss_index = None
+
     def train(self, vectors: np.ndarray, n_samples: int = 50000):
         """ Train PQ codebooks on CPU """
         logger.info(f"Training PQ with {self.n_subspaces} subspaces...")
 
         # Sample subset
         if len(vectors) > n_samples:
-            idx = np.random.choice(len(vectors), n_samples, replace=False)
+            # Sorted so memory-mapped inputs are read front to back
+            idx = np.sort(np.random.choice(len(vectors), n_samples, replace=False))
             vectors = vectors[idx]
 
         vectors = vectors.astype(np.float32)
+        self.codebooks = []
 
         for m in tqdm(range(self.n_subspaces), desc="Training PQ"):
             start = m * self.subvector_dim
             end = start + self.subvector_dim
 
-            subvectors = vectors[:, start:end]
-
-            kmeans = MiniBatchKMeans(
-                n_clusters=self.n_centroids,
-                batch_size=1000,
-                max_iter=50,
-                verbose=0,
-                random_state=42
-            )
-            kmeans.fit(subvectors)
-            self.codebooks.append(kmeans.cluster_centers_)
-
+            subvectors = np.ascontiguousarray(vectors[:, start:end])
+
+            if _FAISS_AVAILABLE:
+                kmeans = faiss.Kmeans(
+                    self.subvector_dim,
+                    self.n_centroids,
+                    niter=25,
+                    seed=42,
+                    verbose=False
+                )
+                kmeans.train(subvectors)
+                self.codebooks.append(kmeans.centroids.copy())
+            else:
+                kmeans = MiniBatchKMeans(
+                    n_clusters=self.n_centroids,
+                    batch_size=1000,
+                    max_iter=50,
+                    verbose=0,
+                    random_state=42
+                )
+                kmeans.fit(subvectors)
+                self.codebooks.append(kmeans.cluster_centers_)
+
+        self._prepare_codebooks()
         self.is_trained = True
         logger.info("✓ PQ training complete")
 
-    def encode(self, vectors: np.ndarray) -> np.ndarray:
-        """ Encode vectors into PQ codes """
+    def train_streaming(self, path: str, n_samples: int = 50000, chunk_size: int = 100000):
+        """
+        Train PQ codebooks from an on-disk .npy without loading it
+
+        Streams the memory-mapped file once and keeps a reservoir of
+        n_samples rows, so memory is bounded by n_samples * D
+        """
+        vectors = np.load(path, mmap_mode="r")
+        logger.info(f"Sampling {min(n_samples, len(vectors)):,} of {len(vectors):,} vectors from {path}")
+
+        sample = reservoir_sample(vectors, n_samples, chunk_size)
+        self.train(sample, n_samples=n_samples)
+
+    def encode(
+        self,
+        vectors: np.ndarray,
+        out: Optional[np.ndarray] = None,
+        chunk_size: int = 65536
+    ) -> np.ndarray:
+        """
+        Encode vectors into PQ codes, written into `out` when given
+
+        Delegates to faiss.IndexPQ.sa_encode when faiss is installed. Otherwise
+        uses ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2 so the distance ranking is
+        one batched GEMM over all subspaces. ||x||^2 is constant over centroids
+        and is dropped from the argmin.
+        """
         if not self.is_trained:
             raise ValueError("PQ is not trained yet")
 
-        vectors = vectors.astype(np.float32)
         n_vectors = len(vectors)
-        codes = np.zeros((n_vectors, self.n_subspaces), dtype=np.uint8)
+        codes = out if out is not None else np.empty((n_vectors, self.n_subspaces), dtype=np.uint8)
+
+        faiss_index = self._get_faiss_index()
+        if faiss_index is not None:
+            for i in range(0, n_vectors, chunk_size):
+                chunk = np.ascontiguousarray(vectors[i:i + chunk_size], dtype=np.float32)
+                faiss_index.sa_encode(chunk, codes=codes[i:i + chunk_size])
+            return codes
+
+        if _NUMBA_AVAILABLE:
+            for i in range(0, n_vectors, chunk_size):
+                chunk = np.ascontiguousarray(vectors[i:i + chunk_size], dtype=np.float32)
+                pq_assign(chunk, self._cb_soa, self._cb_sq, codes[i:i + chunk_size])
+            return codes
+
+        for i in range(0, n_vectors, chunk_size):
+            chunk = np.asarray(vectors[i:i + chunk_size], dtype=np.float32)
+            x = chunk.reshape(len(chunk), self.n_subspaces, self.subvector_dim)
+
+            # (M, n, d) @ (M, d, K) -> (M, n, K)
+            dist = np.matmul(x.transpose(1, 0, 2), self._cb_soa_neg2)
+            dist += self._cb_sq[:, None, :]
+            codes[i:i + chunk_size] = np.argmin(dist, axis=2).T
 
-        for m, codebook in enumerate(self.codebooks):
-            start = m * self.subvector_dim
-            end = start + self.subvector_dim
+        return codes
 
-            subvectors = vectors[:, start:end]
-            distances = np.linalg.norm(
-                subvectors[:, None, :] - codebook[None, :, :],
-                axis=2
-            )
-            codes[:, m] = np.argmin(distances, axis=1)
+    def _prepare_codebooks(self):
+        """ Cache stacked codebooks and their norms so encode is pure GEMM """
+        self.subvector_dim = self.vector_dim // self.n_subspaces
 
-        return codes
+        self._cb_stack = np.ascontiguousarray(np.stack(self.codebooks), dtype=np.float32)  # (M, K, d)
+        self._cb_sq = np.einsum("mkd,mkd->mk", self._cb_stack, self._cb_stack)
+        self._cb_soa = np.ascontiguousarray(self._cb_stack.transpose(0, 2, 1))  # (M, d, K)
+        # -2 folded in so the NumPy surrogate is one GEMM + one in-place add
+        self._cb_soa_neg2 = -2.0 * self._cb_soa
+        self._faiss_index = None
+
+    def _get_faiss_index(self):
+        """ Lazily wrap the trained codebooks in a faiss.IndexPQ (8-bit codes only) """
+        if not _FAISS_AVAILABLE or self.n_centroids != 256:
+            return None
+
+        if self._faiss_index is None:
+            index = faiss.IndexPQ(self.vector_dim, self.n_subspaces, 8)
+            faiss.copy_array_to_vector(self._cb_stack.ravel(), index.pq.centroids)
+            index.is_trained = True
+            self._faiss_index = index
+
+        return self._faiss_index
 
     def decode(self, codes: np.ndarray) -> np.ndarray:
         """ Decode PQ codes back into coarse vectors """
@@ -121,10 +218,38 @@ class ProductQuantizer:
         self.vector_dim = data["vector_dim"]
         self.codebooks = data["codebooks"]
         self.is_trained = data["is_trained"]
+        if self.is_trained:
+            self._prepare_codebooks()
 
         logger.info(f"✓ Loaded PQ model from {path}")
 
 
+def reservoir_sample(
+    vectors: np.ndarray,
+    n_samples: int,
+    chunk_size: int = 100000,
+    seed: int = 42
+) -> np.ndarray:
+    """
+    Uniform sample of n_samples rows in one sequential pass (Algorithm R)
+    Row t replaces reservoir slot j ~ U[0, t] when j < n_samples
+    """
+    n_vectors = len(vectors)
+    if n_vectors <= n_samples:
+        return np.asarray(vectors, dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    reservoir = np.array(vectors[:n_samples], dtype=np.float32)
+
+    for start in tqdm(range(n_samples, n_vectors, chunk_size), desc="Sampling"):
+        chunk = vectors[start:start + chunk_size]
+        slots = rng.integers(0, np.arange(start, start + len(chunk)) + 1)
+        keep = slots < n_samples
+        reservoir[slots[keep]] = chunk[keep]
+
+    return reservoir
+
+
 # ---------------------------------------------------------
 # SCALAR QUANTIZER (FLOAT32 → INT8)
 # ---------------------------------------------------------
@@ -132,22 +257,63 @@ class ScalarQuantizer:
     def __init__(self):
         self.min_val = None
         self.max_val = None
+        self.inv_scale = None
+        self.bias = None
         self.is_fitted = False
 
-    def fit(self, vectors: np.ndarray):
-        """Learn min/max values per dimension"""
-        self.min_val = vectors.min(axis=0)
-        self.max_val = vectors.max(axis=0)
+    def fit(self, vectors: Union[np.ndarray, str, Path], chunk_size: int = 262144):
+        """
+        Learn min/max values per dimension
+        Accepts an array or a .npy path; reduces chunk by chunk in one pass
+        """
+        if isinstance(vectors, (str, Path)):
+            vectors = np.load(vectors, mmap_mode="r")
+
+        dim = vectors.shape[1]
+        min_val = np.full(dim, np.inf, dtype=np.float32)
+        max_val = np.full(dim, -np.inf, dtype=np.float32)
+
+        for i in range(0, len(vectors), chunk_size):
+            block = vectors[i:i + chunk_size]
+            np.minimum(min_val, block.min(axis=0), out=min_val)
+            np.maximum(max_val, block.max(axis=0), out=max_val)
+
+        self.min_val = min_val
+        self.max_val = max_val
+        self._precompute()
         self.is_fitted = True
         logger.info("✓ ScalarQuantizer fitted")
 
-    def quantize(self, vectors: np.ndarray) -> np.ndarray:
-        """Normalize → scale to [0,255] → uint8"""
+    def _precompute(self):
+        """Cache q = x * inv_scale + bias so quantize is one FMA per element"""
+        self.min_val = np.asarray(self.min_val, dtype=np.float32)
+        self.max_val = np.asarray(self.max_val, dtype=np.float32)
+
+        # Constant dimensions all quantize to 0; avoids a runtime epsilon
+        value_range = self.max_val - self.min_val
+        value_range[value_range == 0] = 1.0
+
+        self.inv_scale = (255.0 / value_range).astype(np.float32)
+        self.bias = (-self.min_val * self.inv_scale).astype(np.float32)
+
+    def quantize(self, vectors: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Normalize → scale to [0,255] → uint8, written into `out` when given"""
         if not self.is_fitted:
             raise ValueError("Quantizer not fitted")
 
-        normalized = (vectors - self.min_val) / (self.max_val - self.min_val + 1e-8)
-        return (normalized * 255).astype(np.uint8)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if out is None:
+            out = np.empty(vectors.shape, dtype=np.uint8)
+
+        if _NUMBA_AVAILABLE:
+            sq_quantize(vectors, self.inv_scale, self.bias, out)
+            return out
+
+        scaled = vectors * self.inv_scale
+        scaled += self.bias
+        np.clip(scaled, 0, 255, out=scaled)
+        np.copyto(out, scaled, casting="unsafe")
+        return out
 
     def dequantize(self, quantized: np.ndarray) -> np.ndarray:
         """uint8 → float32"""
@@ -170,25 +336,35 @@ class ScalarQuantizer:
         self.min_val = data["min_val"]
         self.max_val = data["max_val"]
         self.is_fitted = data["is_fitted"]
+        if self.is_fitted:
+            self._precompute()
         logger.info(f"✓ Loaded scalar quantizer from {path}")
 
 
 # ---------------------------------------------------------
 # OPTIONAL: EVALUATION METRICS
 # ---------------------------------------------------------
-def evaluate_compression(original: np.ndarray, reconstructed: np.ndarray):
-    mse = np.mean((original - reconstructed) ** 2)
-    mae = np.mean(np.abs(original - reconstructed))
-    cosine = np.mean(
-        np.sum(
-            original / (np.linalg.norm(original, axis=1, keepdims=True) + 1e-8) *
-            reconstructed / (np.linalg.norm(reconstructed, axis=1, keepdims=True) + 1e-8),
-            axis=1
-        )
-    )
+def evaluate_compression(original: np.ndarray, reconstructed: np.ndarray, chunk_size: int = 65536):
+    """MSE, MAE and mean cosine similarity, computed without N x D temporaries"""
+    n_vectors, dim = original.shape
+
+    if _NUMBA_AVAILABLE:
+        se, ae, cos = compression_sums(original, reconstructed)
+    else:
+        se = ae = cos = 0.0
+        for i in range(0, n_vectors, chunk_size):
+            o = np.asarray(original[i:i + chunk_size], dtype=np.float32)
+            r = np.asarray(reconstructed[i:i + chunk_size], dtype=np.float32)
+            diff = o - r
+            se += float(np.einsum("ij,ij->", diff, diff))
+            ae += float(np.abs(diff, out=diff).sum())
+            dots = np.einsum("ij,ij->i", o, r)
+            norms_o = np.linalg.norm(o, axis=1) + 1e-8
+            norms_r = np.linalg.norm(r, axis=1) + 1e-8
+            cos += float((dots / (norms_o * norms_r)).sum())
 
     return {
-        "mse": mse,
-        "mae": mae,
-        "cosine_similarity": cosine
+        "mse": se / (n_vectors * dim),
+        "mae": ae / (n_vectors * dim),
+        "cosine_similarity": cos / n_vectors
     }
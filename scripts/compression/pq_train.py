@@ -24,17 +24,17 @@ def main():
     output_dir.mkdir(parents=True, exist_ok=True)
 
     logger.info("Loading embeddings...")
-    vectors = np.load(args.embeddings)
+    vectors = np.load(args.embeddings, mmap_mode="r")
     logger.info(f"Loaded {vectors.shape[0]:,} vectors")
 
     # Train PQ -------------------------------------------------
     pq = ProductQuantizer()
-    pq.train(vectors, n_samples=args.samples)
+    pq.train_streaming(args.embeddings, n_samples=args.samples)
     pq.save(output_dir / "pq_codebook.pkl")
 
     # Train scalar quantizer -----------------------------------
     sq = ScalarQuantizer()
-    sq.fit(vectors)
+    sq.fit(args.embeddings)
     sq.save(output_dir / "scalar_quantizer.pkl")
 
     logger.info("✓ PQ + ScalarQuantizer training complete")
@@ -5,7 +5,10 @@ Extract ~2M valid YouTube IDs
 CPU ONLY - No audio download or processing
 """
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import requests
 from pathlib import Path
 import logging
@@ -16,9 +19,9 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AudioSetPreparation:
-    def __init__(self, output_csv: str):
-        self.output_csv = Path(output_csv)
-        self.output_csv.parent.mkdir(parents=True, exist_ok=True)
+    def __init__(self, output_path: str):
+        self.output_path = Path(output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
         
         # AudioSet CSV URLs
         self.urls = {
@@ -33,13 +36,23 @@ class AudioSetPreparation:
         logger.info(f"Downloading {name}...")
         
         try:
+            response = requests.get(url, timeout=120)
+            response.raise_for_status()
+
+            # Rows look like `YTID, start, end, "mid1,mid2"`; dropping the space
+            # after each delimiter lets the quoted label list parse as one field
+            body = response.content.replace(b', ', b',')
+
             # AudioSet CSVs have comments (lines starting with #)
-            df = pd.read_csv(
-                url,
-                skiprows=3,  # Skip comment lines
-                names=['YTID', 'start_seconds', 'end_seconds', 'positive_labels'],
-                dtype={'YTID': str}
+            table = pacsv.read_csv(
+                pa.BufferReader(body),
+                read_options=pacsv.ReadOptions(
+                    skip_rows=3,  # Skip comment lines
+                    column_names=['YTID', 'start_seconds', 'end_seconds', 'positive_labels']
+                ),
+                convert_options=pacsv.ConvertOptions(column_types={'YTID': pa.string()})
             )
+            df = table.to_pandas()
             logger.info(f"✓ Downloaded {name}: {len(df):,} entries")
             return df
         except Exception as e:
@@ -88,21 +101,21 @@ class AudioSetPreparation:
         # Clean data
         logger.info("Cleaning data...")
         
-        # Remove duplicates
-        df_all = df_all.drop_duplicates(subset=['YTID', 'start_seconds'])
+        # Remove duplicates: hash (YTID, start_seconds) into one uint64 per row
+        # so dedup compares integers instead of Python string objects
+        row_hash = pd.util.hash_pandas_object(df_all[['YTID', 'start_seconds']], index=False)
+        df_all = df_all[~row_hash.duplicated().to_numpy()]
         
         # Remove entries with missing labels
         df_all = df_all[df_all['positive_labels'].notna()]
         
-        # Parse labels (comma-separated MIDs)
-        def parse_labels(label_str):
-            mids = label_str.strip('"').split(',')
-            return [label_map.get(mid.strip(), 'Unknown') for mid in mids]
-        
-        df_all['label_names'] = df_all['positive_labels'].apply(parse_labels)
+        # Parse labels (comma-separated MIDs): explode once, map, regroup per row
+        mids = df_all['positive_labels'].str.strip('"').str.split(',').explode().str.strip()
+        label_names = mids.map(label_map).fillna('Unknown')
+        df_all['label_names'] = label_names.groupby(level=0, sort=False).agg(list)
         
         # Add metadata
-        df_all['media_id'] = [f"audioset_{i:08d}" for i in range(len(df_all))]
+        df_all['media_id'] = np.char.add('audioset_', np.char.zfill(np.arange(len(df_all)).astype(str), 8))
         df_all['media_type'] = 'audio'
         df_all['duration'] = df_all['end_seconds'] - df_all['start_seconds']
         
@@ -116,10 +129,10 @@ class AudioSetPreparation:
             'positive_labels', 'label_names', 'split'
         ]]
         
-        # Save to CSV
-        df_final.to_csv(self.output_csv, index=False)
+        # Save to Parquet
+        df_final.to_parquet(self.output_path, engine='pyarrow', compression='zstd', index=False)
         
-        logger.info(f"✓ Saved {len(df_final):,} entries to {self.output_csv}")
+        logger.info(f"✓ Saved {len(df_final):,} entries to {self.output_path}")
         
         # Statistics
         logger.info("\n=== Statistics ===")
@@ -131,7 +144,7 @@ class AudioSetPreparation:
         logger.info(df_final['split'].value_counts())
 
 if __name__ == "__main__":
-    OUTPUT_CSV = "data/processed/audioset_2m.csv"
+    OUTPUT_PATH = "data/processed/audioset_2m.parquet"
     
-    prep = AudioSetPreparation(output_csv=OUTPUT_CSV)
+    prep = AudioSetPreparation(output_path=OUTPUT_PATH)
     prep.prepare_audioset()
\ No newline at end of file
@@ -7,90 +7,106 @@ CPU ONLY - No GPU required
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
+import os
 from typing import List
 from tqdm import tqdm
-import re
-from urllib.parse import urlparse
+import zlib
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Scheme + non-empty host
+# Evaluated by Arrow's match_substring_regex, so RE2 syntax, not Python's re
+_URL_PATTERN = r'^https?://[^\s/]+'
+
+_OUTPUT_COLUMNS = ['URL', 'TEXT', 'WIDTH', 'HEIGHT', 'similarity']
+
+# Fixed output schema: shards disagree on types (e.g. WIDTH as double vs int64),
+# so every table is cast to this before it reaches the writer
+_OUTPUT_SCHEMA = pa.schema([
+    ('media_id', pa.string()),
+    ('media_type', pa.string()),
+    ('URL', pa.string()),
+    ('TEXT', pa.string()),
+    ('WIDTH', pa.int64()),
+    ('HEIGHT', pa.int64()),
+    ('similarity', pa.float64()),
+])
+
 class LAIONSampler:
     def __init__(
         self,
         laion_parquet_dir: str,
-        output_csv: str,
+        output_path: str,
         sample_rate: float = 0.03,  # 3% sampling
         min_width: int = 256,
         min_height: int = 256,
         min_caption_length: int = 10
     ):
         self.laion_dir = Path(laion_parquet_dir)
-        self.output_csv = Path(output_csv)
+        self.output_path = Path(output_path)
         self.sample_rate = sample_rate
         self.min_width = min_width
         self.min_height = min_height
         self.min_caption_length = min_caption_length
         
         # Create output directory
-        self.output_csv.parent.mkdir(parents=True, exist_ok=True)
-    
-    def is_valid_url(self, url: str) -> bool:
-        """Check if URL is valid"""
-        try:
-            result = urlparse(url)
-            return all([result.scheme, result.netloc])
-        except:
-            return False
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    def clean_row(self, row: pd.Series) -> bool:
+    def filter_expression(self) -> ds.Expression:
         """
         Filter out invalid rows
-        Returns True if row should be kept
+        Pushed down into the parquet reader so rejected rows are never materialized
         """
-        # Check NSFW flag
-        if row.get('NSFW', 'UNLIKELY') not in ['UNLIKELY', 'UNSURE']:
-            return False
-        
-        # Check URL
-        if not self.is_valid_url(row.get('URL', '')):
-            return False
-        
-        # Check dimensions
-        width = row.get('WIDTH', 0)
-        height = row.get('HEIGHT', 0)
-        if width < self.min_width or height < self.min_height:
-            return False
-        
-        # Check caption
-        caption = str(row.get('TEXT', ''))
-        if len(caption.strip()) < self.min_caption_length:
-            return False
-        
-        return True
+        caption_length = pc.utf8_length(pc.utf8_trim_whitespace(ds.field('TEXT')))
+        
+        return (
+            # Check NSFW flag
+            ds.field('NSFW').isin(['UNLIKELY', 'UNSURE'])
+            # Check URL
+            & pc.match_substring_regex(ds.field('URL'), _URL_PATTERN)
+            # Check dimensions
+            & (ds.field('WIDTH') >= self.min_width)
+            & (ds.field('HEIGHT') >= self.min_height)
+            # Check caption
+            & (caption_length >= self.min_caption_length)
+        )
     
     def process_parquet_file(self, parquet_path: Path) -> pd.DataFrame:
         """Process a single parquet file"""
         try:
-            # Read parquet with sampling
-            df = pd.read_parquet(parquet_path)
+            dataset = ds.dataset(parquet_path, format='parquet')
+            scanner = dataset.scanner(
+                columns=_OUTPUT_COLUMNS,
+                filter=self.filter_expression(),
+                batch_size=131072
+            )
             
-            # Random sampling
-            n_samples = int(len(df) * self.sample_rate)
-            df_sampled = df.sample(n=n_samples, random_state=42)
+            # Bernoulli sampling per batch, seeded per file for reproducibility
+            rng = np.random.default_rng([42, zlib.crc32(parquet_path.name.encode())])
             
-            # Apply cleaning filters
-            mask = df_sampled.apply(self.clean_row, axis=1)
-            df_clean = df_sampled[mask]
+            n_clean = 0
+            batches = []
+            for batch in scanner.to_batches():
+                n_clean += batch.num_rows
+                keep = rng.random(batch.num_rows) < self.sample_rate
+                batches.append(batch.filter(pa.array(keep)))
+            
+            df_sampled = pa.Table.from_batches(batches, schema=scanner.projected_schema).to_pandas()
             
             logger.info(
                 f"Processed {parquet_path.name}: "
-                f"{len(df)} → {len(df_sampled)} sampled → {len(df_clean)} clean"
+                f"{dataset.count_rows()} → {n_clean} clean → {len(df_sampled)} sampled"
             )
             
-            return df_clean[['URL', 'TEXT', 'WIDTH', 'HEIGHT', 'similarity']]
+            return df_sampled
         
         except Exception as e:
             logger.error(f"Error processing {parquet_path}: {e}")
@@ -109,48 +125,61 @@ class LAIONSampler:
         
         logger.info(f"Found {len(parquet_files)} parquet files")
         
-        # Process all files
-        all_samples = []
-        for parquet_file in tqdm(parquet_files, desc="Processing LAION files"):
-            df_clean = self.process_parquet_file(parquet_file)
-            if not df_clean.empty:
-                all_samples.append(df_clean)
-        
-        # Combine all samples
-        df_final = pd.concat(all_samples, ignore_index=True)
+        # Process shards in parallel, streaming each result straight to the
+        # output file instead of concatenating everything in the driver
+        n_workers = min(os.cpu_count() or 1, len(parquet_files))
+        writer = None
+        n_total = 0
+        totals = {'caption_length': 0, 'similarity': 0.0, 'WIDTH': 0, 'HEIGHT': 0}
         
-        # Add unique IDs
-        df_final['media_id'] = [f"laion_{i:08d}" for i in range(len(df_final))]
-        df_final['media_type'] = 'image'
-        
-        # Reorder columns
-        df_final = df_final[[
-            'media_id', 'media_type', 'URL', 'TEXT', 
-            'WIDTH', 'HEIGHT', 'similarity'
-        ]]
-        
-        # Save to CSV
-        df_final.to_csv(self.output_csv, index=False)
-        
-        logger.info(f"✓ Saved {len(df_final)} samples to {self.output_csv}")
-        logger.info(f"Target: ~12M samples, Got: {len(df_final):,}")
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                results = executor.map(self.process_parquet_file, parquet_files)
+                for df_clean in tqdm(results, total=len(parquet_files), desc="Processing LAION files"):
+                    if df_clean.empty:
+                        continue
+                    
+                    # Add unique IDs
+                    row_ids = np.arange(n_total, n_total + len(df_clean)).astype(str)
+                    df_clean.insert(0, 'media_id', np.char.add('laion_', np.char.zfill(row_ids, 8)))
+                    df_clean.insert(1, 'media_type', 'image')
+                    
+                    table = pa.Table.from_pandas(df_clean, preserve_index=False).cast(_OUTPUT_SCHEMA)
+                    if writer is None:
+                        writer = pq.ParquetWriter(self.output_path, _OUTPUT_SCHEMA, compression='zstd')
+                    writer.write_table(table)
+                    
+                    n_total += len(df_clean)
+                    totals['caption_length'] += df_clean['TEXT'].str.len().sum()
+                    totals['similarity'] += df_clean['similarity'].sum()
+                    totals['WIDTH'] += df_clean['WIDTH'].sum()
+                    totals['HEIGHT'] += df_clean['HEIGHT'].sum()
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        if writer is None:
+            raise ValueError(f"No valid samples found in {self.laion_dir}")
+        
+        logger.info(f"✓ Saved {n_total} samples to {self.output_path}")
+        logger.info(f"Target: ~12M samples, Got: {n_total:,}")
         
         # Statistics
         logger.info("\n=== Statistics ===")
-        logger.info(f"Total samples: {len(df_final):,}")
-        logger.info(f"Avg caption length: {df_final['TEXT'].str.len().mean():.1f}")
-        logger.info(f"Avg similarity: {df_final['similarity'].mean():.3f}")
-        logger.info(f"Avg width: {df_final['WIDTH'].mean():.0f}")
-        logger.info(f"Avg height: {df_final['HEIGHT'].mean():.0f}")
+        logger.info(f"Total samples: {n_total:,}")
+        logger.info(f"Avg caption length: {totals['caption_length'] / n_total:.1f}")
+        logger.info(f"Avg similarity: {totals['similarity'] / n_total:.3f}")
+        logger.info(f"Avg width: {totals['WIDTH'] / n_total:.0f}")
+        logger.info(f"Avg height: {totals['HEIGHT'] / n_total:.0f}")
 
 if __name__ == "__main__":
     # Configuration
     LAION_DIR = "/path/to/laion400m/parquet"  # Update this
-    OUTPUT_CSV = "data/processed/laion_12m_sample.csv"
+    OUTPUT_PATH = "data/processed/laion_12m_sample.parquet"
     
     sampler = LAIONSampler(
         laion_parquet_dir=LAION_DIR,
-        output_csv=OUTPUT_CSV,
+        output_path=OUTPUT_PATH,
         sample_rate=0.03  # 3% = ~12M samples
     )
     
@@ -5,6 +5,7 @@ Extract 200K video URLs
 CPU ONLY
 """
 
+import numpy as np
 import pandas as pd
 import requests
 from pathlib import Path
@@ -14,9 +15,9 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class VGGSoundPreparation:
-    def __init__(self, output_csv: str):
-        self.output_csv = Path(output_csv)
-        self.output_csv.parent.mkdir(parents=True, exist_ok=True)
+    def __init__(self, output_path: str):
+        self.output_path = Path(output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
         
         # VGG-Sound dataset URL
         self.train_url = "https://www.robots.ox.ac.uk/~vgg/data/vggsound/vggsound.csv"
@@ -54,7 +55,7 @@ class VGGSoundPreparation:
         df_all = df_all.drop_duplicates(subset=['youtube_id', 'start_time'])
         
         # Add metadata
-        df_all['media_id'] = [f"vggsound_{i:08d}" for i in range(len(df_all))]
+        df_all['media_id'] = np.char.add('vggsound_', np.char.zfill(np.arange(len(df_all)).astype(str), 8))
         df_all['media_type'] = 'video'
         
         # Construct YouTube URL
@@ -76,9 +77,9 @@ class VGGSoundPreparation:
             logger.info("Sampled down to 200K entries")
         
         # Save
-        df_final.to_csv(self.output_csv, index=False)
+        df_final.to_parquet(self.output_path, engine='pyarrow', compression='zstd', index=False)
         
-        logger.info(f"✓ Saved {len(df_final):,} entries to {self.output_csv}")
+        logger.info(f"✓ Saved {len(df_final):,} entries to {self.output_path}")
         
         # Statistics
         logger.info("\n=== Statistics ===")
@@ -89,7 +90,7 @@ class VGGSoundPreparation:
         logger.info(df_final['label'].value_counts().head(10))
 
 if __name__ == "__main__":
-    OUTPUT_CSV = "data/processed/vggsound_200k.csv"
+    OUTPUT_PATH = "data/processed/vggsound_200k.parquet"
     
-    prep = VGGSoundPreparation(output_csv=OUTPUT_CSV)
+    prep = VGGSoundPreparation(output_path=OUTPUT_PATH)
     prep.prepare_vggsound()
\ No newline at end of file
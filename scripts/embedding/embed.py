@@ -1,7 +1,8 @@
 # scripts/embedding/embed.py
 """
 ImageBind embedding generation pipeline
-Placeholder that works on CPU, GPU implementation to be added later
+Uses ImageBind (bf16 autocast on GPU) when installed,
+otherwise falls back to placeholder random vectors on CPU
 """
 
 import numpy as np
@@ -9,93 +10,129 @@ import pickle
 from pathlib import Path
 import logging
 from typing import List, Dict, Optional
-import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Try to import ImageBind
+try:
+    import torch
+    from imagebind import data
+    from imagebind.models import imagebind_model
+    from imagebind.models.imagebind_model import ModalityType
+    _IMAGEBIND_AVAILABLE = True
+except ImportError:
+    _IMAGEBIND_AVAILABLE = False
+
+_RNG = np.random.default_rng()
+
+
+def _l2_normalize_inplace(x: np.ndarray) -> None:
+    """Row-wise L2 normalize a float32 (N, D) array without temporaries the size of x"""
+    norms = np.einsum("ij,ij->i", x, x)
+    np.sqrt(norms, out=norms)
+    norms += np.float32(1e-8)
+    x /= norms[:, None]
+
+
 class ImageBindEmbedder:
     """
-    Placeholder for ImageBind multimodal embeddings
-    Currently generates random embeddings for testing
-    Replace with real ImageBind when GPU is available
+    ImageBind multimodal embeddings
+    Generates random embeddings for testing when ImageBind is not installed
     """
     
     def __init__(self, device: str = "cpu"):
         self.device = device
         self.embedding_dim = 1024
         self.is_loaded = False
+        self.model = None
         
-        logger.warning("⚠️  Using PLACEHOLDER embeddings (random vectors)")
-        logger.warning("⚠️  Replace with real ImageBind when GPU is available")
+        if not _IMAGEBIND_AVAILABLE:
+            logger.warning("⚠️  Using PLACEHOLDER embeddings (random vectors)")
+            logger.warning("⚠️  Install ImageBind to generate real embeddings")
     
     def load_model(self):
-        """Load ImageBind model (placeholder)"""
-        # TODO: Replace with actual ImageBind loading
-        # from imagebind import data, models
-        # self.model = models.imagebind_huge(pretrained=True)
-        # self.model.eval()
-        # self.model.to(self.device)
-        
-        logger.info(f"✓ Model loaded (placeholder) on {self.device}")
+        """Load ImageBind model (placeholder if not installed)"""
+        if _IMAGEBIND_AVAILABLE:
+            self.model = imagebind_model.imagebind_huge(pretrained=True)
+            self.model.eval()
+            self.model.to(self.device)
+            logger.info(f"✓ Model loaded on {self.device}")
+        else:
+            logger.info(f"✓ Model loaded (placeholder) on {self.device}")
         self.is_loaded = True
     
-    def embed_images(self, image_paths: List[str]) -> np.ndarray:
+    def _forward(self, modality: str, inputs) -> np.ndarray:
+        """Batched forward pass, bf16 autocast on GPU, float32 unit vectors out"""
+        use_bf16 = self.device.startswith("cuda") and torch.cuda.is_bf16_supported()
+        with torch.inference_mode(), torch.autocast("cuda", dtype=torch.bfloat16, enabled=use_bf16):
+            out = self.model({modality: inputs})[modality]
+        embeddings = out.float().cpu().numpy()
+        _l2_normalize_inplace(embeddings)
+        return embeddings
+    
+    def _placeholder_embeddings(self, n: int) -> np.ndarray:
+        """Random unit vectors, generated and normalized in float32 in place"""
+        embeddings = _RNG.standard_normal((n, self.embedding_dim), dtype=np.float32)
+        _l2_normalize_inplace(embeddings)
+        return embeddings
+    
+    def preload(self, paths: List[str], media_type: str):
         """
-        Generate embeddings for images
-        
-        TODO: Replace with:
-        inputs = data.load_and_transform_vision_data(image_paths, self.device)
-        with torch.no_grad():
-            embeddings = self.model.forward({"vision": inputs})
-        return embeddings["vision"].cpu().numpy()
+        Read and decode a batch of media ahead of the forward pass
+        Safe to run in a background thread; returns paths as-is for the placeholder
         """
         if not self.is_loaded:
             self.load_model()
         
-        # Placeholder: random normalized vectors
-        embeddings = np.random.randn(len(image_paths), self.embedding_dim)
-        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
-        
-        return embeddings.astype(np.float32)
+        if media_type not in ("image", "audio", "video"):
+            raise ValueError(f"Unknown media type: {media_type}")
+        if self.model is None:
+            return paths
+        if media_type == "audio":
+            return data.load_and_transform_audio_data(paths, self.device)
+        # Video frames are treated as images
+        return data.load_and_transform_vision_data(paths, self.device)
+    
+    def embed_images_preloaded(self, inputs) -> np.ndarray:
+        """Generate embeddings for images already decoded by preload"""
+        if self.model is None:
+            return self._placeholder_embeddings(len(inputs))
+        return self._forward(ModalityType.VISION, inputs)
+    
+    def embed_audio_preloaded(self, inputs) -> np.ndarray:
+        """Generate embeddings for audio already decoded by preload"""
+        if self.model is None:
+            return self._placeholder_embeddings(len(inputs))
+        return self._forward(ModalityType.AUDIO, inputs)
+    
+    def embed_preloaded(self, inputs, media_type: str) -> np.ndarray:
+        if media_type == "audio":
+            return self.embed_audio_preloaded(inputs)
+        return self.embed_images_preloaded(inputs)
+    
+    def embed_images(self, image_paths: List[str]) -> np.ndarray:
+        """Generate embeddings for images"""
+        return self.embed_images_preloaded(self.preload(image_paths, "image"))
     
     def embed_audio(self, audio_paths: List[str]) -> np.ndarray:
-        """
-        Generate embeddings for audio
-        
-        TODO: Replace with:
-        inputs = data.load_and_transform_audio_data(audio_paths, self.device)
-        with torch.no_grad():
-            embeddings = self.model.forward({"audio": inputs})
-        return embeddings["audio"].cpu().numpy()
-        """
-        if not self.is_loaded:
-            self.load_model()
-        
-        embeddings = np.random.randn(len(audio_paths), self.embedding_dim)
-        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
-        
-        return embeddings.astype(np.float32)
+        """Generate embeddings for audio"""
+        return self.embed_audio_preloaded(self.preload(audio_paths, "audio"))
     
     def embed_text(self, texts: List[str]) -> np.ndarray:
-        """
-        Generate embeddings for text
-        
-        TODO: Replace with:
-        inputs = data.load_and_transform_text(texts, self.device)
-        with torch.no_grad():
-            embeddings = self.model.forward({"text": inputs})
-        return embeddings["text"].cpu().numpy()
-        """
+        """Generate embeddings for text"""
         if not self.is_loaded:
             self.load_model()
         
-        embeddings = np.random.randn(len(texts), self.embedding_dim)
-        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
-        
-        return embeddings.astype(np.float32)
+        if self.model is None:
+            return self._placeholder_embeddings(len(texts))
+        inputs = data.load_and_transform_text(texts, self.device)
+        return self._forward(ModalityType.TEXT, inputs)
     
     def embed_video_frames(self, frame_paths: List[str]) -> np.ndarray:
         """Video frames are treated as images"""
@@ -114,49 +151,51 @@ def process_dataset_batch(
     """
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    all_embeddings = []
-    all_metadata = []
+    # Filled in place; failed batches are skipped, so only out[:filled] is valid
+    out = np.empty((len(input_paths), embedder.embedding_dim), dtype=np.float32)
+    filled = 0
+    # Row i of the saved embeddings belongs to file_paths[i]
+    file_paths = []
     
     logger.info(f"Processing {len(input_paths)} {media_type} files...")
     
-    for i in tqdm(range(0, len(input_paths), batch_size)):
-        batch_paths = input_paths[i:i + batch_size]
+    # Two-stage pipeline: the next batch is read and decoded in a background
+    # thread while the current one runs through the model
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        next_batch = prefetcher.submit(embedder.preload, input_paths[:batch_size], media_type)
         
-        try:
-            # Generate embeddings based on media type
-            if media_type == "image":
-                embeddings = embedder.embed_images(batch_paths)
-            elif media_type == "audio":
-                embeddings = embedder.embed_audio(batch_paths)
-            elif media_type == "video":
-                embeddings = embedder.embed_video_frames(batch_paths)
-            else:
-                raise ValueError(f"Unknown media type: {media_type}")
+        for i in tqdm(range(0, len(input_paths), batch_size)):
+            batch_paths = input_paths[i:i + batch_size]
+            current_batch = next_batch
+            if i + batch_size < len(input_paths):
+                next_batch = prefetcher.submit(
+                    embedder.preload, input_paths[i + batch_size:i + 2 * batch_size], media_type
+                )
             
-            # Save metadata
-            for j, path in enumerate(batch_paths):
-                all_embeddings.append(embeddings[j])
-                all_metadata.append({
-                    'file_path': path,
-                    'media_type': media_type,
-                    'embedding_idx': len(all_embeddings) - 1
-                })
-        
-        except Exception as e:
-            logger.error(f"Failed to process batch {i}: {e}")
-            continue
+            try:
+                embeddings = embedder.embed_preloaded(current_batch.result(), media_type)
+                
+                out[filled:filled + len(batch_paths)] = embeddings
+                file_paths.extend(batch_paths)
+                filled += len(batch_paths)
+            
+            except Exception as e:
+                logger.error(f"Failed to process batch {i}: {e}")
+                continue
     
     # Save embeddings
-    embeddings_array = np.array(all_embeddings, dtype=np.float32)
     embeddings_file = output_dir / f"{media_type}_embeddings.npy"
-    np.save(embeddings_file, embeddings_array)
+    np.save(embeddings_file, out[:filled])
     
     # Save metadata
-    metadata_file = output_dir / f"{media_type}_metadata.json"
-    with open(metadata_file, 'w') as f:
-        json.dump(all_metadata, f, indent=2)
-    
-    logger.info(f"✓ Saved {len(all_embeddings)} embeddings to {embeddings_file}")
+    metadata_file = output_dir / f"{media_type}_metadata.parquet"
+    metadata = pa.table({
+        'file_path': pa.array(file_paths, type=pa.string()),
+        'media_type': pa.array([media_type] * filled, type=pa.string()),
+    })
+    pq.write_table(metadata, metadata_file, compression='zstd')
+    
+    logger.info(f"✓ Saved {filled} embeddings to {embeddings_file}")
     logger.info(f"✓ Saved metadata to {metadata_file}")
 
 
@@ -182,24 +221,24 @@ def main():
     embedder.load_model()
     
     # Process LAION images
-    laion_csv = data_dir / "laion_12m_sample.csv"
-    if laion_csv.exists():
+    laion_metadata = data_dir / "laion_12m_sample.parquet"
+    if laion_metadata.exists():
         logger.info("Processing LAION images...")
         # TODO: Load actual image paths from CSV
         # For now, placeholder
-        logger.warning("⚠️  Skipping LAION - implement CSV loader")
+        logger.warning("⚠️  Skipping LAION - implement metadata loader")
     
     # Process AudioSet
-    audioset_csv = data_dir / "audioset_2m.csv"
-    if audioset_csv.exists():
+    audioset_metadata = data_dir / "audioset_2m.parquet"
+    if audioset_metadata.exists():
         logger.info("Processing AudioSet...")
-        logger.warning("⚠️  Skipping AudioSet - implement CSV loader")
+        logger.warning("⚠️  Skipping AudioSet - implement metadata loader")
     
     # Process VGG-Sound
-    vggsound_csv = data_dir / "vggsound_urls.csv"
-    if vggsound_csv.exists():
+    vggsound_metadata = data_dir / "vggsound_200k.parquet"
+    if vggsound_metadata.exists():
         logger.info("Processing VGG-Sound...")
-        logger.warning("⚠️  Skipping VGG-Sound - implement CSV loader")
+        logger.warning("⚠️  Skipping VGG-Sound - implement metadata loader")
     
     logger.info("✓ Embedding pipeline complete (placeholder)")
     logger.info("Replace with real ImageBind implementation when GPU is available")
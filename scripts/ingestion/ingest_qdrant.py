@@ -1,52 +1,198 @@
 """
 Ingest compressed embeddings into Qdrant
 CPU ONLY
+Takes either offline codes with row-aligned metadata, or the workers'
+int8 embedding shard with its media_id,row,scale sidecar
 """
 
+import asyncio
 import numpy as np
 import pandas as pd
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
+import pyarrow as pa
+import pyarrow.parquet as pq
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Batch, HnswConfigDiff, OptimizersConfigDiff
 from pathlib import Path
+from typing import Iterator
 from tqdm import tqdm
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def ingest_qdrant(
+# Qdrant defaults, restored once a bulk load finishes
+HNSW_M = 16
+INDEXING_THRESHOLD = 20000
+
+
+async def set_bulk_load_mode(client: AsyncQdrantClient, collection: str, enabled: bool):
+    """
+    Bulk-load mode disables HNSW graph building and indexing so the optimizer
+    doesn't repeatedly re-index partially loaded data; disabling it rebuilds once
+    """
+    await client.update_collection(
+        collection_name=collection,
+        hnsw_config=HnswConfigDiff(m=0 if enabled else HNSW_M),
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=0 if enabled else INDEXING_THRESHOLD)
+    )
+    logger.info(f"Bulk-load mode {'enabled' if enabled else 'disabled'} for {collection}")
+
+
+def iter_metadata(metadata_path: str, batch_size: int) -> Iterator[pa.RecordBatch]:
+    """
+    Yield metadata in upload-sized Arrow batches so only the current batch is in memory.
+    Nulls (including CSV NaN) come out of to_pylist as None, and list columns
+    such as AudioSet's label_names as plain lists, as Qdrant payloads require
+    """
+    if Path(metadata_path).suffix == ".parquet":
+        yield from pq.ParquetFile(metadata_path).iter_batches(batch_size=batch_size)
+    else:
+        for chunk in pd.read_csv(metadata_path, chunksize=batch_size):
+            yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+
+
+def _raise_first_failure(tasks: list):
+    """Re-raise the first failed upsert so the load stops instead of reading on"""
+    for task in tasks:
+        if task.done() and not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+
+def iter_points(pq_codes: np.ndarray, metadata_path: str, batch_size: int) -> Iterator[Batch]:
+    """Offline codes: row i of pq_codes belongs to row i of the metadata"""
+    n_rows = 0
+    for batch_meta in iter_metadata(metadata_path, batch_size):
+        start, n_rows = n_rows, n_rows + batch_meta.num_rows
+        assert n_rows <= len(pq_codes), "metadata has more rows than pq_codes"
+        yield Batch(
+            ids=batch_meta.column("media_id").cast(pa.string()).to_pylist(),
+            vectors=np.ascontiguousarray(pq_codes[start:n_rows], dtype=np.float32),
+            payloads=batch_meta.to_pylist()
+        )
+    assert n_rows == len(pq_codes), "metadata has fewer rows than pq_codes"
+
+
+def iter_shard_points(shard: np.ndarray, index_path: str, batch_size: int) -> Iterator[Batch]:
+    """
+    Worker-written int8 shard: the sidecar (media_id,row,scale) says which rows
+    are filled, the rest of the preallocated shard is unused.
+    Vectors are dequantized with q * scale / 127
+    """
+    for batch_meta in iter_metadata(index_path, batch_size):
+        ids = batch_meta.column("media_id").cast(pa.string()).to_pylist()
+        rows = batch_meta.column("row").to_numpy()
+        scale = batch_meta.column("scale").to_numpy().astype(np.float32)
+        vectors = shard[rows].astype(np.float32)
+        vectors *= (scale / 127)[:, None]
+        yield Batch(ids=ids, vectors=vectors, payloads=[{"media_id": media_id} for media_id in ids])
+
+
+async def _upload(
+    client: AsyncQdrantClient,
+    collection: str,
+    points: Iterator[Batch],
+    total: int,
+    concurrency: int
+) -> int:
+    """
+    Keep up to `concurrency` upserts in flight so RTT, WAL and serialization overlap.
+    Each batch is submitted once the next one has been read, so reading stays
+    one batch ahead of the `concurrency` batches in flight.
+    All but the last batch go out with wait=False; the last is sent with
+    wait=True after the rest are acknowledged, so returning means every
+    point has been applied (before the caller re-enables indexing).
+    A failed upsert is raised before the next batch is submitted
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    pbar = tqdm(total=total, desc="Uploading")
+
+    async def bounded_upsert(batch: Batch):
+        try:
+            await client.upsert(collection_name=collection, points=batch, wait=False)
+            pbar.update(len(batch.ids))
+        finally:
+            semaphore.release()
+
+    tasks = []
+    n_points = 0
+    pending = None
+    try:
+        for batch in points:
+            n_points += len(batch.ids)
+
+            if pending is not None:
+                _raise_first_failure(tasks)
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(bounded_upsert(pending)))
+
+            pending = batch
+
+        await asyncio.gather(*tasks)
+
+        # Final flush: Qdrant applies updates in order, so this returns
+        # only once everything queued before it is applied too
+        if pending is not None:
+            await client.upsert(collection_name=collection, points=pending, wait=True)
+            pbar.update(len(pending.ids))
+    finally:
+        for task in tasks:
+            task.cancel()
+        pbar.close()
+
+    return n_points
+
+
+async def _ingest(
     pq_codes: str,
-    metadata_csv: str,
-    host: str = "localhost",
-    port: int = 6333,
-    collection: str = "media",
-    batch_size: int = 5000
+    metadata_path: str,
+    host: str,
+    port: int,
+    collection: str,
+    batch_size: int,
+    concurrency: int,
+    bulk_mode: bool
 ):
-    client = QdrantClient(host=host, port=port)
+    # gRPC: vectors go over the wire as packed floats instead of JSON lists
+    client = AsyncQdrantClient(host=host, port=port, grpc_port=6334, prefer_grpc=True)
 
-    pq_codes = np.load(pq_codes)
-    metadata = pd.read_csv(metadata_csv)
+    # Memory-mapped: only the pages behind the batches in flight are resident
+    codes = np.load(pq_codes, mmap_mode="r")
 
-    assert len(pq_codes) == len(metadata)
+    if codes.dtype == np.int8:
+        # One embedding shard + sidecar from the workers (embeddings-{n}.i8.npy / embeddings-{n}.index.csv)
+        points, total = iter_shard_points(codes, metadata_path, batch_size), None
+        logger.info(f"Uploading shard rows listed in {metadata_path} to Qdrant")
+    else:
+        points, total = iter_points(codes, metadata_path, batch_size), len(codes)
+        logger.info(f"Uploading {len(codes):,} items to Qdrant")
 
-    logger.info(f"Uploading {len(metadata):,} items to Qdrant")
+    if bulk_mode:
+        await set_bulk_load_mode(client, collection, enabled=True)
 
-    for i in tqdm(range(0, len(metadata), batch_size), desc="Uploading"):
-        batch_meta = metadata.iloc[i:i+batch_size]
-        batch_codes = pq_codes[i:i+batch_size]
+    try:
+        n_points = await _upload(client, collection, points, total, concurrency)
+    finally:
+        if bulk_mode:
+            await set_bulk_load_mode(client, collection, enabled=False)
+        await client.close()
 
-        points = []
-        for idx, row in batch_meta.iterrows():
-            points.append(PointStruct(
-                id=str(row["media_id"]),
-                vector=batch_codes[idx % batch_size].tolist(),
-                payload=row.to_dict()
-            ))
+    logger.info(f"Uploaded {n_points:,} points")
 
-        client.upsert(
-            collection_name=collection,
-            points=points
-        )
+
+def ingest_qdrant(
+    pq_codes: str,
+    metadata_path: str,
+    host: str = "localhost",
+    port: int = 6333,
+    collection: str = "media",
+    batch_size: int = 256,
+    concurrency: int = 2,
+    bulk_mode: bool = True
+):
+    asyncio.run(_ingest(
+        pq_codes, metadata_path, host, port, collection,
+        batch_size, concurrency, bulk_mode
+    ))
 
     logger.info("✓ Ingestion completed successfully")
 
@@ -57,10 +203,16 @@ if __name__ == "__main__":
     parser.add_argument("--pq-codes", required=True)
     parser.add_argument("--metadata", required=True)
     parser.add_argument("--collection", default="media")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=2, help="upserts in flight")
+    parser.add_argument("--no-bulk-mode", action="store_true", help="keep indexing enabled during upload")
     args = parser.parse_args()
 
     ingest_qdrant(
         pq_codes=args.pq_codes,
-        metadata_csv=args.metadata,
-        collection=args.collection
+        metadata_path=args.metadata,
+        collection=args.collection,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        bulk_mode=not args.no_bulk_mode
     )
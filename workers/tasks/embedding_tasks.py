@@ -1,19 +1,88 @@
 # backend/workers/tasks/embedding_tasks.py
 from celery_app import app
+from celery.signals import worker_process_init
 import logging
 from core.embeddings import get_embedder
+from core.embedding_shard import get_shard_writer
 from core.qdrant_client import get_qdrant_client, QdrantWrapper
 import numpy as np
 import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from qdrant_client import QdrantClient
 from qdrant_client.http.models import PointStruct
 
 logger = logging.getLogger(__name__)
 
 
-def qdrant_client():
-    from core.config import get_settings
-    s = get_settings()
-    return get_qdrant_client(s.QDRANT_URL, s.QDRANT_API_KEY)
+# One client (and gRPC channel) per worker process, reused across tasks
+_CLIENT: Optional[QdrantClient] = None
+
+
+def qdrant_client() -> QdrantClient:
+    global _CLIENT
+    if _CLIENT is None:
+        from core.config import get_settings
+        s = get_settings()
+        # gRPC carries vectors as packed floats rather than JSON lists
+        _CLIENT = get_qdrant_client(s.QDRANT_URL, s.QDRANT_API_KEY, prefer_grpc=True)
+    return _CLIENT
+
+
+@worker_process_init.connect
+def _init_qdrant_client(**kwargs):
+    """Build the client in each prefork child; channels inherited over fork are unusable"""
+    global _CLIENT
+    _CLIENT = None
+    if _upload_direct_to_qdrant():
+        qdrant_client()
+
+
+def _warm_embedder():
+    try:
+        get_embedder()
+    except Exception:
+        logger.exception("Embedder warm-up failed; will retry on first task")
+
+
+@worker_process_init.connect
+def _init_embedder(**kwargs):
+    """
+    Opt-in (PRELOAD_EMBEDDER=true): start loading the model in each prefork child.
+    Runs in a background thread because Celery kills children that stay in
+    worker_process_init longer than worker_proc_alive_timeout (4 s by default)
+    """
+    if os.getenv("PRELOAD_EMBEDDER", "false").lower() not in ("1", "true", "yes"):
+        return
+    threading.Thread(target=_warm_embedder, name="embedder-warmup", daemon=True).start()
+
+
+def _upload_direct_to_qdrant() -> bool:
+    return os.getenv("UPLOAD_DIRECT_TO_QDRANT", "false").lower() in ("1", "true", "yes")
+
+
+def quantize_int8(vecs: np.ndarray, quantile: float = 0.99) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric int8 quantization with one scale per vector (last axis),
+    clipping at the given quantile of |x| like Qdrant's INT8 scalar quantization.
+    Dequantize with q * scale / 127.
+    """
+    scale = np.quantile(np.abs(vecs), quantile, axis=-1, keepdims=True).astype(np.float32)
+    scale[scale == 0] = 1.0
+    q = np.rint(vecs / scale * 127)
+    np.clip(q, -127, 127, out=q)
+    return q.astype(np.int8), scale.squeeze(-1)
+
+
+def _point_payload(media_id: str, media_type: str, upload_result: dict) -> Dict:
+    return {
+        "media_id": media_id,
+        "media_type": media_type,
+        "thumbnail_url": upload_result.get("thumbnail_url"),
+        "preview_url": upload_result.get("preview_url"),
+        "file_key": upload_result.get("file_key"),
+    }
 
 
 @app.task(bind=True, name="workers.tasks.embedding_tasks.embed_media_task", max_retries=3)
@@ -23,27 +92,105 @@ def embed_media_task(self, media_id: str, local_path: str, media_type: str, uplo
         vec = embedder.embed_single(local_path, media_type)
         vec = np.asarray(vec, dtype=np.float32)
 
-        emb_dir = os.getenv("EMBEDDINGS_DIR", "/app/data/embeddings")
-        os.makedirs(emb_dir, exist_ok=True)
-        out_file = os.path.join(emb_dir, f"{media_id}.npy")
-        np.save(out_file, vec)
-        logger.info(f"Saved embedding {out_file}")
+        # int8 + per-vector scale: 4x smaller on disk than float32
+        q, scale = quantize_int8(vec)
+        writer = get_shard_writer()
+        row = writer.write([media_id], q, scale)
+        out_file = str(writer.shard_path)
+        logger.info(f"Saved embedding {media_id} to {out_file} row {row}")
 
         # Optionally upload to Qdrant Cloud
-        if os.getenv("UPLOAD_DIRECT_TO_QDRANT", "false").lower() in ("1", "true", "yes"):
+        if _upload_direct_to_qdrant():
             q = qdrant_client()
             wrapper = QdrantWrapper(q, os.getenv("QDRANT_COLLECTION", "media"))
-            point = PointStruct(id=media_id, vector=vec.tolist(), payload={
-                "media_id": media_id,
-                "media_type": media_type,
-                "thumbnail_url": upload_result.get("thumbnail_url"),
-                "preview_url": upload_result.get("preview_url"),
-                "file_key": upload_result.get("file_key"),
-            })
+            point = PointStruct(id=media_id, vector=vec, payload=_point_payload(media_id, media_type, upload_result))
             q.upsert(collection_name=os.getenv("QDRANT_COLLECTION", "media"), points=[point])
             logger.info(f"Uploaded to Qdrant: {media_id}")
 
-        return {"status": "ok", "media_id": media_id, "embedding_file": out_file}
+        return {"status": "ok", "media_id": media_id, "embedding_file": out_file, "row": row}
     except Exception as e:
         logger.exception("Embedding failed")
         raise self.retry(exc=e, countdown=10)
+
+
+def _embed_group(embedder, media_type: str, group: List[Tuple[str, dict]]) -> Tuple[List[Tuple[str, dict]], List[np.ndarray]]:
+    """
+    Embed one media type's uploads in a single call. If that fails (e.g. one
+    unreadable file), embed them one at a time and skip the ones that still fail.
+    Returns the embedded (media_id, upload_result) pairs and their (N, D) arrays.
+    """
+    try:
+        return group, [embedder.embed_batch([r["local_path"] for _, r in group], media_type)]
+    except Exception:
+        logger.exception(f"Batch embedding of {len(group)} {media_type} items failed, embedding one at a time")
+
+    embedded, vecs = [], []
+    for media_id, upload_result in group:
+        try:
+            vecs.append(embedder.embed_batch([upload_result["local_path"]], media_type))
+            embedded.append((media_id, upload_result))
+        except Exception:
+            logger.exception(f"Embedding failed for {media_id}, skipping")
+    return embedded, vecs
+
+
+@app.task(bind=True, name="workers.tasks.embedding_tasks.embed_media_batch_task", max_retries=3)
+def embed_media_batch_task(self, upload_results: List[dict], items: List[dict]):
+    """
+    Embed a group of uploaded media in one pass.
+    upload_results: upload_batch_task output, aligned with items;
+        failed uploads come back as {"success": False}
+    items: dicts with media_id and media_type
+    Items that fail to upload or embed are skipped, not retried with the group.
+    Only work up to the shard write is retried, so each row is written once.
+    """
+    # One embed_batch call per media type
+    groups = defaultdict(list)
+    for item, upload_result in zip(items, upload_results):
+        if upload_result.get("success", False):
+            groups[item["media_type"]].append((item["media_id"], upload_result))
+        else:
+            logger.error(f"Upload failed for {item['media_id']}, skipping embedding")
+
+    try:
+        embedder = get_embedder()
+        media_ids, media_types, results, vecs = [], [], [], []
+        for media_type, group in groups.items():
+            embedded, group_vecs = _embed_group(embedder, media_type, group)
+            vecs.extend(group_vecs)
+            for media_id, upload_result in embedded:
+                media_ids.append(media_id)
+                media_types.append(media_type)
+                results.append(upload_result)
+
+        if not media_ids:
+            return {"status": "failed", "media_ids": [], "error": "nothing uploaded and embedded"}
+        vecs = np.concatenate(vecs).astype(np.float32, copy=False)
+
+        q, scales = quantize_int8(vecs)
+        writer = get_shard_writer()
+        row = writer.write(media_ids, q, scales)
+    except Exception as e:
+        logger.exception("Batch embedding failed")
+        raise self.retry(exc=e, countdown=10)
+
+    out_file = str(writer.shard_path)
+    logger.info(f"Saved {len(media_ids)} embeddings to {out_file} rows {row}-{row + len(media_ids) - 1}")
+    result = {"status": "ok", "media_ids": media_ids, "embedding_file": out_file, "row": row}
+
+    # Optionally upload to Qdrant Cloud, all points in one request.
+    # The rows are already in the shard, so a failure here is reported, not retried
+    if _upload_direct_to_qdrant():
+        try:
+            q = qdrant_client()
+            points = [
+                PointStruct(id=media_id, vector=vecs[i], payload=_point_payload(media_id, media_type, upload_result))
+                for i, (media_id, media_type, upload_result) in enumerate(zip(media_ids, media_types, results))
+            ]
+            q.upsert(collection_name=os.getenv("QDRANT_COLLECTION", "media"), points=points)
+            logger.info(f"Uploaded {len(points)} points to Qdrant")
+        except Exception as e:
+            logger.exception("Qdrant upload failed; embeddings remain in the shard")
+            result["qdrant_error"] = str(e)
+
+    return result
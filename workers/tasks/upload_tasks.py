@@ -2,34 +2,153 @@
 from celery_app import app
 import logging
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Tuple, Union
+from urllib.parse import urlparse
 from core.config import get_settings
 from core.storage import upload_file_to_s3, generate_presigned_url, s3_key_for_media
 import os
+import asyncio
+import tempfile
+import aiohttp
+import requests
 import ffmpeg
 from PIL import Image
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# libvips shrinks on load instead of decoding the full-resolution image
+try:
+    import pyvips
+    _PYVIPS_AVAILABLE = True
+except Exception as e:
+    logger.warning(f"pyvips not available, using Pillow for thumbnails: {e}")
+    _PYVIPS_AVAILABLE = False
+
+
+# Large reads mean fewer syscalls per MB than requests' 8 KiB default
+_STREAM_CHUNK = 1 << 16
+_ASYNC_STREAM_CHUNK = 1 << 20
+
+
+def _is_remote(source_path: str) -> bool:
+    return urlparse(source_path).scheme in ("http", "https")
+
+
+def _temp_path_for(url: str) -> Path:
+    fd, path = tempfile.mkstemp(suffix=Path(urlparse(url).path).suffix)
+    os.close(fd)
+    return Path(path)
+
+
+def download_file_to_temp(url: str) -> Path:
+    """Download a single URL to a temp file (blocking)"""
+    out = _temp_path_for(url)
+    try:
+        with requests.get(url, stream=True, timeout=60) as resp:
+            resp.raise_for_status()
+            with open(out, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=_STREAM_CHUNK):
+                    f.write(chunk)
+    except BaseException:
+        out.unlink(missing_ok=True)
+        raise
+    return out
+
+
+async def _download_many(urls: List[str]) -> List[Union[Path, BaseException]]:
+    """
+    Download all URLs concurrently over one session, preserving order.
+    A failed URL yields its exception in place of a path (and leaves no temp file)
+    """
+    async def _one(session: aiohttp.ClientSession, url: str) -> Path:
+        out = _temp_path_for(url)
+        try:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                with open(out, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(_ASYNC_STREAM_CHUNK):
+                        f.write(chunk)
+        except BaseException:
+            out.unlink(missing_ok=True)
+            raise
+        return out
+
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        return await asyncio.gather(*[_one(session, url) for url in urls], return_exceptions=True)
+
 
 def make_thumbnail(local_path: Path, size=(300, 300)) -> Path:
     out = local_path.with_name(f"{local_path.stem}_thumb.jpg")
+    if _PYVIPS_AVAILABLE:
+        img = pyvips.Image.thumbnail(str(local_path), size[0], height=size[1], size="down")
+        img.jpegsave(str(out), Q=85, strip=True)
+        return out
     with Image.open(local_path) as img:
         img.thumbnail(size)
         img.save(out, format="JPEG", quality=85)
     return out
 
 
-def make_video_preview(local_video: Path, seconds: int = 3) -> Path:
+def make_video_preview(local_video: Path, seconds: int = 3) -> Tuple[Path, Path]:
+    """
+    Short preview clip and first-frame still from one ffmpeg run,
+    so the input is opened and decoded once
+    Returns (preview, frame)
+    """
     out = local_video.with_suffix(".preview.mp4")
-    (
-        ffmpeg.input(str(local_video), ss=0)
-        .output(str(out), t=seconds, vcodec="libx264", acodec="aac", preset="veryfast")
-        .overwrite_output()
-        .run(quiet=True)
-    )
-    return out
+    frame = local_video.with_name(f"{local_video.stem}_frame.jpg")
+    inp = ffmpeg.input(str(local_video), ss=0)
+    preview_out = inp.output(str(out), t=seconds, vcodec="libx264", acodec="aac", preset="veryfast")
+    frame_out = inp.output(str(frame), vframes=1, format="image2")
+    ffmpeg.merge_outputs(preview_out, frame_out).overwrite_output().run(quiet=True)
+    return out, frame
+
+
+def _process_upload(media_id: str, local: Path, media_type: str) -> Dict:
+    """Upload a local file plus its thumbnail/preview and presign the URLs"""
+    thumbnail_url = None
+    preview_url = None
+    file_key = None
+
+    if media_type == "image":
+        # upload original
+        file_key = s3_key_for_media(media_id, "image", local.name)
+        upload_file_to_s3(local, file_key)
+        # thumbnail
+        thumb = make_thumbnail(local)
+        thumb_key = s3_key_for_media(media_id, "thumbnail", thumb.name)
+        upload_file_to_s3(thumb, thumb_key)
+        thumbnail_url = generate_presigned_url(thumb_key)
+
+    elif media_type == "audio":
+        file_key = s3_key_for_media(media_id, "audio", local.name)
+        upload_file_to_s3(local, file_key)
+        thumbnail_url = generate_presigned_url(file_key)
+
+    elif media_type == "video":
+        # upload original video
+        file_key = s3_key_for_media(media_id, "video", local.name)
+        upload_file_to_s3(local, file_key)
+        # preview
+        preview, tmp_frame = make_video_preview(local)
+        preview_key = s3_key_for_media(media_id, "preview", preview.name)
+        upload_file_to_s3(preview, preview_key)
+        preview_url = generate_presigned_url(preview_key)
+        # thumbnail
+        thumb = make_thumbnail(tmp_frame)
+        thumb_key = s3_key_for_media(media_id, "thumbnail", thumb.name)
+        upload_file_to_s3(thumb, thumb_key)
+        thumbnail_url = generate_presigned_url(thumb_key)
+
+    else:
+        # generic file
+        file_key = s3_key_for_media(media_id, "media", local.name)
+        upload_file_to_s3(local, file_key)
+        thumbnail_url = generate_presigned_url(file_key)
+
+    return {"success": True, "thumbnail_url": thumbnail_url, "preview_url": preview_url, "file_key": file_key, "local_path": str(local)}
 
 
 @app.task(bind=True, name="workers.tasks.upload_tasks.upload_file_task", max_retries=2)
@@ -39,55 +158,59 @@ def upload_file_task(self, media_id: str, source_path: str, media_type: str, sto
     generate presigned URLs for thumbnail and preview (if any).
     Returns dict with thumbnail_url, preview_url, local_path.
     """
+    downloaded = None
     try:
-        local = Path(source_path)
-        # If it's a remote URL (not local file), you should download it prior to calling this task.
+        if _is_remote(source_path):
+            local = downloaded = download_file_to_temp(source_path)
+        else:
+            local = Path(source_path)
         if not local.exists():
             raise FileNotFoundError(f"Local path not found: {local}")
 
-        thumbnail_url = None
-        preview_url = None
-        file_key = None
-
-        if media_type == "image":
-            # upload original
-            file_key = s3_key_for_media(media_id, "image", local.name)
-            upload_file_to_s3(local, file_key)
-            # thumbnail
-            thumb = make_thumbnail(local)
-            thumb_key = s3_key_for_media(media_id, "thumbnail", thumb.name)
-            upload_file_to_s3(thumb, thumb_key)
-            thumbnail_url = generate_presigned_url(thumb_key)
-
-        elif media_type == "audio":
-            file_key = s3_key_for_media(media_id, "audio", local.name)
-            upload_file_to_s3(local, file_key)
-            thumbnail_url = generate_presigned_url(file_key)
-
-        elif media_type == "video":
-            # upload original video
-            file_key = s3_key_for_media(media_id, "video", local.name)
-            upload_file_to_s3(local, file_key)
-            # preview
-            preview = make_video_preview(local)
-            preview_key = s3_key_for_media(media_id, "preview", preview.name)
-            upload_file_to_s3(preview, preview_key)
-            preview_url = generate_presigned_url(preview_key)
-            # thumbnail
-            tmp_frame = local.with_name(f"{local.stem}_frame.jpg")
-            (ffmpeg.input(str(local), ss=0).output(str(tmp_frame), vframes=1).overwrite_output().run(quiet=True))
-            thumb = make_thumbnail(tmp_frame)
-            thumb_key = s3_key_for_media(media_id, "thumbnail", thumb.name)
-            upload_file_to_s3(thumb, thumb_key)
-            thumbnail_url = generate_presigned_url(thumb_key)
-
-        else:
-            # generic file
-            file_key = s3_key_for_media(media_id, "media", local.name)
-            upload_file_to_s3(local, file_key)
-            thumbnail_url = generate_presigned_url(file_key)
-
-        return {"success": True, "thumbnail_url": thumbnail_url, "preview_url": preview_url, "file_key": file_key, "local_path": str(local)}
+        return _process_upload(media_id, local, media_type)
     except Exception as exc:
         logger.exception("Upload worker failed")
+        # A retry downloads again, so don't leave this copy behind
+        if downloaded is not None:
+            downloaded.unlink(missing_ok=True)
+        if self.request.retries >= self.max_retries:
+            # Report rather than raise, so a chord callback still gets the rest of its batch
+            return {"success": False, "error": str(exc), "local_path": source_path}
         raise self.retry(exc=exc, countdown=10)
+
+
+@app.task(bind=True, name="workers.tasks.upload_tasks.upload_batch_task", max_retries=2)
+def upload_batch_task(self, items: List[Dict], storage_hint: str = "s3") -> List[Dict]:
+    """
+    Upload a group of media in one task.
+    items: dicts with media_id, source_path (local path or http(s) URL), media_type
+    Remote sources are downloaded concurrently with one event loop per group.
+    Returns one upload_file_task-style dict per item, in order.
+    """
+    local_paths = [Path(item["source_path"]) for item in items]
+    errors = [None] * len(items)
+    remote = [i for i, item in enumerate(items) if _is_remote(item["source_path"])]
+    if remote:
+        downloaded = asyncio.run(_download_many([items[i]["source_path"] for i in remote]))
+        for i, result in zip(remote, downloaded):
+            if isinstance(result, BaseException):
+                logger.error(f"Download failed for {items[i]['media_id']}: {result}")
+                errors[i] = result
+            else:
+                local_paths[i] = result
+
+    results = []
+    for i, (item, local) in enumerate(zip(items, local_paths)):
+        if errors[i] is not None:
+            results.append({"success": False, "error": str(errors[i]), "local_path": item["source_path"]})
+            continue
+        try:
+            if not local.exists():
+                raise FileNotFoundError(f"Local path not found: {local}")
+            results.append(_process_upload(item["media_id"], local, item["media_type"]))
+        except Exception as e:
+            logger.exception(f"Upload failed for {item['media_id']}")
+            if _is_remote(item["source_path"]):
+                local.unlink(missing_ok=True)
+            results.append({"success": False, "error": str(e), "local_path": str(local)})
+    return results
@@ -1,7 +1,8 @@
 # backend/workers/worker_tasks.py
 from celery_app import app
-from workers.tasks.upload_tasks import upload_file_task
-from workers.tasks.embedding_tasks import embed_media_task
+from workers.tasks.upload_tasks import upload_file_task, upload_batch_task
+from workers.tasks.embedding_tasks import embed_media_task, embed_media_batch_task
+from typing import List
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,7 +10,7 @@ logger = logging.getLogger(__name__)
 @app.task(name="workers.worker_tasks.process_and_embed")
 def process_and_embed(media_id: str, source_url: str, media_type: str, storage_hint: str = "r2"):
     logger.info(f"Orchestrator for {media_id}")
-    upload_result = upload_file_task.apply(kwargs={"media_id": media_id, "source_url": source_url, "media_type": media_type, "storage_hint": storage_hint}).get()
+    upload_result = upload_file_task.apply(kwargs={"media_id": media_id, "source_path": source_url, "media_type": media_type, "storage_hint": storage_hint}).get()
     if not upload_result.get("success", False):
         logger.error(f"Upload failed for {media_id}")
         return {"status": "failed", "error": upload_result}
@@ -17,3 +18,18 @@ def process_and_embed(media_id: str, source_url: str, media_type: str, storage_h
     job = embed_media_task.delay(media_id, upload_result["local_path"], media_type, upload_result)
     logger.info(f"Scheduled embedding task {job.id}")
     return {"status": "enqueued", "media_id": media_id, "embed_task_id": job.id}
+
+
+@app.task(name="workers.worker_tasks.process_and_embed_batch")
+def process_and_embed_batch(items: List[dict], storage_hint: str = "r2"):
+    """
+    items: dicts with media_id, source_path (local path or http(s) URL), media_type,
+    the same shape upload_batch_task takes.
+    One task uploads the whole group (downloads run concurrently) and its
+    results feed straight into a single batched embedding task.
+    """
+    logger.info(f"Batch orchestrator for {len(items)} items")
+    embed_items = [{"media_id": item["media_id"], "media_type": item["media_type"]} for item in items]
+    job = (upload_batch_task.s(items, storage_hint=storage_hint) | embed_media_batch_task.s(embed_items)).delay()
+    logger.info(f"Scheduled batch embedding task {job.id}")
+    return {"status": "enqueued", "media_ids": [item["media_id"] for item in items], "embed_task_id": job.id}